@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import time
+import click
+import logging
+import tempfile
+import dask
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+
+from dask.distributed import Client, LocalCluster, get_task_stream
+from jetstream.model.model import Model
+from jetstream.model.analysis import Analysis
+from jetstream.profiling import MemorySampler
+from jetstream.synthetic import synthetic_temperature
+
+STAGES = [
+    'temperature_bounds',
+    'data_array_dask_df',
+    'grid_area_xr',
+    'effective_latitude_xr',
+    't_prime_calculation',
+]
+
+PRODUCTS = {
+    'analysis': Analysis,
+    'model': Model,
+}
+
+
+def get_logger(log_level):
+    ch = logging.StreamHandler(sys.stdout)
+    formatter = logging.Formatter(' - '.join(
+        ["%(asctime)s", "%(name)s", "%(levelname)s", "%(message)s"]))
+    ch.setFormatter(formatter)
+    logger = logging.getLogger(__file__)
+    logger.setLevel(log_level)
+    ch.setLevel(log_level)
+    logger.addHandler(ch)
+
+    return logger
+
+
+def run_stage(client, product_class, path, stage, n_days, engine, chunks):
+    """ Run a pipeline stage from a fresh product object
+
+    Stages are cached properties that depend on the previous stages, so each
+    stage is measured from a new object and its numbers include all the
+    stages it needs.
+
+    Returns: dict with wall time (s), peak memory (bytes) and number of dask
+    tasks run in the cluster.
+    """
+
+    start_date = '2000-12-01'
+    end_date = (pd.Timestamp(start_date) +
+                pd.Timedelta(days=n_days - 1)).strftime('%Y-%m-%d')
+
+    product = product_class(
+        path_to_files=path,
+        subset_dict={'time': slice(start_date, end_date), 'lat': 20},
+        temp_interval_size=1,
+        chunks=chunks,
+        rescale_longitude=True,
+        engine=engine
+    )
+
+    with get_task_stream(client) as task_stream, MemorySampler() as memory:
+        start = time.perf_counter()
+        result = getattr(product, stage)
+        if dask.is_dask_collection(result):
+            dask.compute(result)
+        wall_time = time.perf_counter() - start
+
+    return {
+        'wall_time': wall_time,
+        'peak_memory': memory.peak,
+        'n_tasks': len(task_stream.data),
+    }
+
+
+@click.command()
+@click.option('--resolutions', default='2.5,1,0.25',
+              help='Comma-separated grid spacings in degrees')
+@click.option('--days', default='90,360',
+              help='Comma-separated number of days')
+@click.option('--products', default='analysis,model',
+              help='Comma-separated products (analysis, model)')
+@click.option('--stages', default=','.join(STAGES),
+              help='Comma-separated pipeline stages')
+@click.option('--engine', default='dataframe',
+              type=click.Choice(['dataframe', 'array']))
+@click.option('--time_chunk', default=10, help='Days per chunk')
+@click.option('--repeat', default=1, help='Runs per stage')
+@click.option('--n_workers', default=2, help='Local cluster workers')
+@click.option('--threads_per_worker', default=2, help='Threads per worker')
+@click.option('--data_path', default=None,
+              help='Path to keep the synthetic files (temporary by default)')
+@click.option('--output', default='benchmark.json',
+              help='JSON file to append the results')
+@click.option('--log_level', default='INFO')
+def cli(resolutions,
+        days,
+        products,
+        stages,
+        engine,
+        time_chunk,
+        repeat,
+        n_workers,
+        threads_per_worker,
+        data_path,
+        output,
+        log_level):
+    """
+    Benchmark the pipeline stages on synthetic grids
+
+    Synthetic NetCDF temperature fields are generated for each resolution and
+    number of days, and each stage of the jetstream.Analysis or
+    jetstream.Model pipeline runs in a local dask cluster. Wall time, peak
+    memory (this process and the workers) and the number of dask tasks are
+    recorded per stage, so regressions and improvements are visible.
+
+    Results are appended to the output JSON file, one record per run, and
+    printed as a table.
+
+    Returns:
+    None. Save to path directly.
+    """
+    logger = get_logger(log_level)
+
+    resolutions = [float(r) for r in resolutions.split(',')]
+    days = [int(d) for d in days.split(',')]
+    products = products.split(',')
+    stages = stages.split(',')
+
+    for stage in stages:
+        if stage not in STAGES:
+            raise ValueError(f'{stage} is not a valid stage: {STAGES}')
+
+    tmp_dir = None
+    if data_path is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        data_path = tmp_dir.name
+    os.makedirs(data_path, exist_ok=True)
+
+    cluster = LocalCluster(n_workers=n_workers,
+                           threads_per_worker=threads_per_worker)
+    client = Client(cluster)
+    logger.info(f'Local cluster: {client}')
+
+    run_id = datetime.now().isoformat()
+    records = []
+    try:
+        for product in products:
+            for resolution in resolutions:
+                for n_days in days:
+                    path = Path(data_path,
+                                f'synthetic_{product}_{resolution}_{n_days}.nc')
+                    if not path.exists():
+                        logger.info(f'Writing {path}')
+                        synthetic_temperature(resolution,
+                                              start_date='2000-12-01',
+                                              n_days=n_days,
+                                              product=product,
+                                              dtype=np.float32).to_netcdf(path)
+
+                    for stage in stages:
+                        for run in range(repeat):
+                            metrics = run_stage(client,
+                                                PRODUCTS[product],
+                                                path,
+                                                stage,
+                                                n_days,
+                                                engine,
+                                                {'time': time_chunk})
+                            record = {
+                                'run_id': run_id,
+                                'product': product,
+                                'resolution': resolution,
+                                'n_days': n_days,
+                                'engine': engine,
+                                'time_chunk': time_chunk,
+                                'stage': stage,
+                                'run': run,
+                                **metrics
+                            }
+                            logger.info(f'{product} {resolution}° '
+                                        f'{n_days} days {stage}: '
+                                        f'{metrics}')
+                            records.append(record)
+    finally:
+        client.close()
+        cluster.close()
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+    if os.path.exists(output):
+        with open(output) as f:
+            previous = json.load(f)
+    else:
+        previous = []
+
+    with open(output, 'w') as f:
+        json.dump(previous + records, f, indent=2)
+
+    table = pd.DataFrame(records).groupby(
+        ['product', 'resolution', 'n_days', 'stage'], sort=False
+    )[['wall_time', 'peak_memory', 'n_tasks']].median()
+    table['peak_memory'] = table['peak_memory'] / 2**20
+    print(table.rename(columns={'peak_memory': 'peak_memory_mb'}).to_string())
+
+
+if __name__ == '__main__':
+    cli()
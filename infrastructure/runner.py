@@ -10,9 +10,16 @@ from pathlib import Path
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed as pool_as_completed
+
+import psutil
+from dask.utils import parse_bytes
 from jetstream.model.model import Model
 from jetstream.model.analysis import Analysis
-from dask.distributed import Client
+from jetstream.manifest import RunManifest, input_fingerprint
+from dask.distributed import Client, as_completed, worker_client
+from distributed.client import _get_global_client
 
 def get_logger(log_level):
     ch = logging.StreamHandler(sys.stdout)
@@ -27,6 +34,105 @@ def get_logger(log_level):
     return logger
 
 
+def build_product(product_path, save_path, start_date, end_date, model,
+                  output_format='netcdf', profile=False, fused=False,
+                  chunks='auto', precision='float64', temp_bounds=None):
+    """ Build the jetstream.Model or jetstream.Analysis object for a window
+    """
+
+    subset_data = {'time': slice(start_date, end_date), 'lat': 20}
+    # Grid geometry is shared by all windows and products in save_path
+    geometry_cache = os.path.join(save_path, 'geometry')
+
+    if model:
+        model_object = Model(
+            path_to_files=product_path,
+            path_to_save_files=save_path,
+            subset_dict=subset_data,
+            season='DJF',
+            temp_interval_size=1,
+            chunks=chunks,
+            rescale_longitude=True,
+            output_format=output_format,
+            profile=profile,
+            fused=fused,
+            geometry_cache=geometry_cache,
+            precision=precision,
+            temp_bounds=temp_bounds
+        )
+    else:
+        model_object = Analysis(
+            path_to_files=product_path,
+            path_to_save_files=save_path,
+            subset_dict=subset_data,
+            season='DJF',
+            temp_interval_size=1,
+            chunks=chunks,
+            rescale_longitude=True,
+            output_format=output_format,
+            profile=profile,
+            fused=fused,
+            geometry_cache=geometry_cache,
+            precision=precision,
+            temp_bounds=temp_bounds
+        )
+
+    return model_object
+
+
+def run_window(product_path, save_path, start_date, end_date, model,
+               output_format='netcdf', profile=False, fused=False,
+               chunks='auto', precision='float64', temp_bounds=None,
+               on_cluster=False):
+    """ Run the methods pipeline for a window and return the window label
+
+    If the window runs as a task in a dask worker (`on_cluster`), the
+    pipeline computations are submitted back to the same cluster.
+    """
+
+    model_object = build_product(product_path,
+                                 save_path,
+                                 start_date,
+                                 end_date,
+                                 model,
+                                 output_format,
+                                 profile,
+                                 fused,
+                                 chunks,
+                                 precision,
+                                 temp_bounds)
+
+    if on_cluster:
+        with worker_client():
+            model_object.pipeline_methods
+    else:
+        model_object.pipeline_methods
+
+    return f'{start_date}_{end_date}'
+
+
+def window_concurrency(client, parallel_windows, memory_per_window):
+    """ Number of windows to run at the same time
+
+    The number of windows is limited by `parallel_windows` and, if
+    `memory_per_window` is given, by the memory available in the dask
+    workers (or in this machine if there is no client).
+    """
+
+    if memory_per_window is None:
+        return parallel_windows
+
+    if client is not None:
+        workers = client.scheduler_info()['workers'].values()
+        total_memory = sum(w['memory_limit'] for w in workers)
+    else:
+        total_memory = psutil.virtual_memory().total
+
+    max_windows = total_memory // parse_bytes(memory_per_window)
+
+    return max(1, min(parallel_windows, max_windows))
+
+
 @click.command()
 @click.option('--product_path', default='', help='Path to model data')
 @click.option('--save_path', default='', help='Path to save output')
@@ -34,6 +140,29 @@ def get_logger(log_level):
 @click.option('--start_year', default=2015, help="Start year")
 @click.option('--end_year', default=2100, help="End year")
 @click.option('--model', is_flag=True, help='Run Model instead of Analysis')
+@click.option('--overwrite', is_flag=True,
+              help='Recompute windows already completed in the run manifest')
+@click.option('--parallel_windows', default=1,
+              help='Maximum number of year windows to run at the same time')
+@click.option('--memory_per_window', default=None,
+              help='Memory needed per window (e.g. 20GB) to limit concurrency')
+@click.option('--output_format', default='netcdf',
+              type=click.Choice(['netcdf', 'zarr']),
+              help='Write a NetCDF file per window or a Zarr store per product')
+@click.option('--profile', is_flag=True,
+              help='Save a profiling report of the pipeline stages per window')
+@click.option('--fused', is_flag=True,
+              help='Write t-prime and effective latitude in a single compute')
+@click.option('--time_chunk', default='auto',
+              help="Timesteps per chunk, or 'auto' to plan chunks from the "
+                   "files and worker memory")
+@click.option('--precision', default='float64',
+              type=click.Choice(['float64', 'float32']),
+              help='Precision of temperatures, areas and outputs')
+@click.option('--temp_bounds', default=None,
+              help="Fixed temperature bin edges for all dates: 'lower,upper' "
+                   "or 'global' (minimum and maximum of the whole run). "
+                   "Daily edges by default")
 @click.option('--log_level', default='INFO')
 def cli(product_path,
         save_path,
@@ -41,6 +170,15 @@ def cli(product_path,
         start_year,
         end_year,
         model,
+        overwrite,
+        parallel_windows,
+        memory_per_window,
+        output_format,
+        profile,
+        fused,
+        time_chunk,
+        precision,
+        temp_bounds,
         log_level):
     """
     Calculate all methods from paper for a specified model by years
@@ -49,49 +187,207 @@ def cli(product_path,
     object and allow to run the methods pipeline for a user defined group of
     years. The time_step allow us to define the width of the year window. 
 
+    Each completed window is recorded in a run manifest next to the outputs,
+    with a fingerprint of the inputs and the checksums of the outputs. If the
+    job is restarted, windows with complete and valid outputs are skipped,
+    unless --overwrite is passed.
+
+    Windows are independent, so several of them can run at the same time with
+    --parallel_windows. Windows are submitted to the dask.distributed client in
+    the environment, or to a pool of local processes if there is no client.
+    --memory_per_window limits the number of windows to the worker memory.
+
+    With --output_format zarr, all windows are written to a single Zarr store
+    per output, instead of a NetCDF file per window.
+
     Arguments: 
     - product_path: str path to raw model in NetCDF format.
     - save_path: str path to save output data from modeling
     - start_year: int start year. 2015 is set as default following GCM models
     - end_year: int end year. 2100 is set as default following GCM models
     - time_step: int Define a step to divide years. 5 is the default value.
+    - overwrite: bool Recompute all windows. False is the default value.
+    - parallel_windows: int Maximum number of windows running at the same
+      time. 1 is the default value (sequential).
+    - memory_per_window: str Memory needed to process a window.
+    - output_format: str 'netcdf' (default) or 'zarr'.
+    - profile: bool Save a JSON report with the time, dask tasks, I/O and
+      peak memory of each pipeline stage next to the outputs.
+    - fused: bool Build both outputs from one graph and write them with a
+      single compute. The input files are read twice per window (daily
+      temperature bounds, then the outputs), or once with fixed
+      --temp_bounds.
+    - time_chunk: str Number of timesteps per chunk. 'auto' (default) plans
+      the chunks from the input files and the memory of the workers.
+    - precision: str 'float64' (default) or 'float32' to halve memory and
+      output size.
+    - temp_bounds: str Fix the temperature bin edges of all windows to
+      'lower,upper' (e.g. '180,340'), or to the minimum and maximum of all
+      the windows of the run ('global'), computed once before the windows
+      run. By default, edges start at the daily minimum.
 
     Returns:
     None. Save to path directly.
     """
     logger = get_logger(log_level)
 
+    if time_chunk == 'auto':
+        chunks = 'auto'
+    else:
+        chunks = {'time': int(time_chunk)}
+
+    if temp_bounds == 'global':
+        # One pass over all the windows, so they share the same edges
+        last_year = list(range(start_year, end_year, time_step))[-1]
+        run_object = build_product(product_path,
+                                   save_path,
+                                   datetime(start_year, 12, 1).strftime('%Y-%m-%d'),
+                                   datetime(last_year + time_step, 3, 1).strftime('%Y-%m-%d'),
+                                   model,
+                                   output_format,
+                                   chunks=chunks,
+                                   precision=precision,
+                                   temp_bounds='global')
+        bounds = run_object.temperature_bounds
+        temp_bounds = (float(bounds.temp_min[0]), float(bounds.temp_max[0]))
+        logger.info(f'Global temperature bounds: {temp_bounds}')
+    elif temp_bounds is not None:
+        temp_bounds = tuple(float(b) for b in temp_bounds.split(','))
+
     logger.info(f'Initializing t prime calculation')
+    manifest = None
+    pending = []
     for year in range(start_year, end_year, time_step):
         # Define time ranges 
-        start_year = datetime(year, 12, 1).strftime('%Y-%m-%d')
-        end_year = datetime(year + time_step, 3, 1).strftime('%Y-%m-%d')
-        subset_data = {'time': slice(start_year, end_year), 'lat': 20}
-
-        logger.info(f"Start processing -- {start_year} to {end_year}")
-
-        if model:
-            model_object = Model(
-                path_to_files=product_path,
-                path_to_save_files=save_path,
-                subset_dict=subset_data,
-                season='DJF',
-                temp_interval_size=1,
-                chunks={'time': 1},
-                rescale_longitude=True
-            )
-        else:
-            model_object = Analysis(
-                path_to_files=product_path,
-                path_to_save_files=save_path,
-                subset_dict=subset_data,
-                season='DJF',
-                temp_interval_size=1,
-                chunks={'time': 1},
-                rescale_longitude=True
+        start_date = datetime(year, 12, 1).strftime('%Y-%m-%d')
+        end_date = datetime(year + time_step, 3, 1).strftime('%Y-%m-%d')
+
+        model_object = build_product(product_path,
+                                     save_path,
+                                     start_date,
+                                     end_date,
+                                     model,
+                                     output_format,
+                                     chunks=chunks,
+                                     precision=precision,
+                                     temp_bounds=temp_bounds)
+
+        if manifest is None:
+            manifest = RunManifest(
+                os.path.join(model_object.build_save_dirs(),
+                             f'{model_object.product}_manifest.json')
             )
 
-        model_object.pipeline_methods
+        window = f'{start_date}_{end_date}'
+        fingerprint = input_fingerprint(product_path,
+                                        product_class=type(model_object).__name__,
+                                        subset_dict=model_object.subset_dict,
+                                        season=model_object.season,
+                                        temp_interval_size=model_object.temp_interval_size,
+                                        rescale_longitude=model_object.rescale_longitude,
+                                        precision=model_object.precision,
+                                        temp_bounds=model_object.temp_bounds)
+        output_files = model_object.output_files
+
+        if not overwrite and manifest.is_complete(window,
+                                                  fingerprint,
+                                                  output_files):
+            logger.info(f"Skipping completed window -- {start_date} to {end_date}")
+            continue
+
+        manifest.invalidate(window)
+        pending.append((start_date, end_date, fingerprint, output_files))
+
+    windows = {
+        f'{start_date}_{end_date}': (fingerprint, output_files,
+                                     (start_date, end_date))
+        for start_date, end_date, fingerprint, output_files in pending
+    }
+
+    def record_window(window):
+        fingerprint, output_files, time_range = windows[window]
+        manifest.record(window, fingerprint, output_files, time_range)
+        logger.info(f"Finished processing -- {window}")
+
+    if parallel_windows == 1:
+        for start_date, end_date, _, _ in pending:
+            logger.info(f"Start processing -- {start_date} to {end_date}")
+            record_window(run_window(product_path,
+                                     save_path,
+                                     start_date,
+                                     end_date,
+                                     model,
+                                     output_format,
+                                     profile,
+                                     fused,
+                                     chunks,
+                                     precision,
+                                     temp_bounds))
+        return
+
+    client = _get_global_client()
+    concurrency = window_concurrency(client,
+                                     parallel_windows,
+                                     memory_per_window)
+    if client is None and output_format == 'zarr':
+        # Local processes cannot share a lock to update the Zarr metadata
+        logger.warning('Zarr outputs without a dask client run one window '
+                       'at a time')
+        concurrency = 1
+    logger.info(f"Running {len(pending)} windows, {concurrency} at a time")
+
+    if client is not None:
+        # Keep `concurrency` windows in the cluster, and submit a new one
+        # each time a window finishes.
+        queue = iter(pending)
+        futures = as_completed()
+
+        def submit_next():
+            item = next(queue, None)
+            if item is not None:
+                start_date, end_date, _, _ = item
+                logger.info(f"Start processing -- {start_date} to {end_date}")
+                futures.add(client.submit(run_window,
+                                          product_path,
+                                          save_path,
+                                          start_date,
+                                          end_date,
+                                          model,
+                                          output_format,
+                                          profile,
+                                          fused,
+                                          chunks,
+                                          precision,
+                                          temp_bounds,
+                                          on_cluster=True,
+                                          pure=False))
+
+        for _ in range(concurrency):
+            submit_next()
+
+        for future in futures:
+            record_window(future.result())
+            submit_next()
+    else:
+        with ProcessPoolExecutor(max_workers=concurrency) as pool:
+            futures = [
+                pool.submit(run_window,
+                            product_path,
+                            save_path,
+                            start_date,
+                            end_date,
+                            model,
+                            output_format,
+                            profile,
+                            fused,
+                            chunks,
+                            precision,
+                            temp_bounds)
+                for start_date, end_date, _, _ in pending
+            ]
+            for future in pool_as_completed(futures):
+                record_window(future.result())
+
 
 if __name__ == '__main__':
     #path_to_scheduler = os.path.join(os.getenv('SCRATCH'),
@@ -0,0 +1,243 @@
+"""
+Day-of-year baselines (climatologies) and anomalies.
+
+Baselines are computed per day of year and per decade and day of year in a
+single pass over the data: each time chunk is reduced to the sums and counts
+of its groups, and the partial results are added up in a tree reduction, so
+no data are shuffled between groups. Baselines can be saved to a cache
+directory as `<key>_climatology.nc`, where the key names the product,
+variable and period. Anomalies subtract the baseline of each date chunk by
+chunk.
+"""
+
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import xarray as xr
+import dask.array as da
+
+
+def _group_sums(values, codes, n_groups):
+    """ Sums and counts of the non-NaN values of each group in a block
+
+    Returns: np.array with shape (1, 2, n_groups, *values.shape[1:]).
+    """
+
+    sums = np.zeros((2, n_groups) + values.shape[1:])
+
+    for group in np.unique(codes):
+        group_values = values[codes == group]
+        sums[0, group] = np.nansum(group_values, axis=0)
+        sums[1, group] = np.sum(~np.isnan(group_values), axis=0)
+
+    return sums[np.newaxis]
+
+
+def group_sums(values, codes, n_groups):
+    """ Sums and counts of the non-NaN values of each group along time
+
+    Dask arrays are reduced chunk by chunk (map-reduce): each time chunk
+    yields the partial sums of its groups, and the partials are added.
+
+    Parameters:
+        - values (np.array or da.Array): data with time as first axis.
+        - codes (np.array): group of each time, from 0 to `n_groups - 1`.
+        - n_groups (int): number of groups.
+
+    Returns: np.array or da.Array with shape (2, n_groups, *values.shape[1:])
+    with the sums and the counts.
+    """
+
+    if not isinstance(values, da.Array):
+        return _group_sums(values, codes, n_groups)[0]
+
+    codes = da.from_array(codes, chunks=(values.chunks[0], ))
+    space = ''.join(chr(ord('a') + i) for i in range(values.ndim - 1))
+
+    partials = da.blockwise(_group_sums, 'tsg' + space,
+                            values, 't' + space,
+                            codes, 't',
+                            new_axes={'s': 2, 'g': n_groups},
+                            adjust_chunks={'t': 1},
+                            n_groups=n_groups,
+                            dtype=np.float64)
+
+    return partials.sum(axis=0)
+
+
+def baselines(data, decades):
+    """ Day-of-year and decade/day-of-year means in one pass
+
+    Each decade covers contiguous dates, so the data of each decade is
+    reduced by day of year, and the day-of-year means are built from the
+    decade sums. Time chunks shorter than the number of days of year are
+    merged, so the partial sums are not larger than the chunks.
+
+    Parameters:
+        - data (xr.DataArray): data with a `time` dimension.
+        - decades (np.array): decade of each date.
+
+    Returns: xr.Dataset with `doy_mean` (dayofyear, ...) and
+    `decade_doy_mean` (decade, dayofyear, ...). Lazy if `data` is
+    dask-backed.
+    """
+
+    data = data.transpose('time', ...)
+    space_dims = list(data.dims[1:])
+    values = data.data
+
+    doy = data.time.dt.dayofyear.values
+    days = np.unique(doy)
+    day_codes = np.searchsorted(days, doy)
+    decade_values = np.unique(decades)
+
+    if isinstance(values, da.Array) and max(values.chunks[0]) < len(days):
+        values = values.rechunk({0: len(days)})
+
+    decade_sums = []
+    for decade in decade_values:
+        index = np.flatnonzero(decades == decade)
+        decade_sums.append(group_sums(values[index],
+                                      day_codes[index],
+                                      len(days)))
+
+    if isinstance(values, da.Array):
+        decade_sums = da.stack(decade_sums)
+    else:
+        decade_sums = np.stack(decade_sums)
+
+    coords = {'decade': decade_values, 'dayofyear': days}
+    coords.update({
+        dim: data[dim] for dim in space_dims if dim in data.coords
+    })
+    sums = xr.DataArray(decade_sums[:, 0],
+                        dims=['decade', 'dayofyear'] + space_dims,
+                        coords=coords)
+    counts = xr.DataArray(decade_sums[:, 1],
+                          dims=['decade', 'dayofyear'] + space_dims,
+                          coords=coords)
+
+    doy_counts = counts.sum('decade')
+    return xr.Dataset({
+        'doy_mean': sums.sum('decade') / doy_counts.where(doy_counts > 0),
+        'decade_doy_mean': sums / counts.where(counts > 0)
+    })
+
+
+def climatology(data, decades, cache_dir=None, key=None):
+    """ Baselines of `data`, cached on disk
+
+    Without a cache, the baselines stay lazy for dask-backed data, so they
+    can be computed together with the results that use them. Baselines
+    saved to the cache are computed first.
+
+    Parameters:
+        - data (xr.DataArray): data with a `time` dimension.
+        - decades (np.array): decade of each date.
+        - cache_dir (str): directory to save and load baselines. If `None`,
+          baselines are not saved.
+        - key (str): name of the baselines in `cache_dir`, e.g. product,
+          variable and period.
+
+    Returns: xr.Dataset (see `baselines`)
+    """
+
+    path = None
+    if cache_dir is not None and key is not None:
+        path = os.path.join(cache_dir, f'{key}_climatology.nc')
+
+    if path is not None and os.path.exists(path):
+        with xr.open_dataset(path) as baseline:
+            return baseline.load()
+
+    baseline = baselines(data, decades)
+    if path is None:
+        return baseline
+
+    baseline = baseline.compute()
+
+    # Another process may have saved the same baselines meanwhile
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.nc', dir=cache_dir)
+        os.close(fd)
+        try:
+            baseline.to_netcdf(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    return baseline
+
+
+def _subtract_baseline(values, codes, table):
+    return values - table[codes]
+
+
+def anomaly(data, baseline, decades=None):
+    """ Subtract the baseline of each date
+
+    The baseline of each date is picked by day of year (and decade if
+    `decades` is given) and subtracted chunk by chunk, so dask-backed data
+    stays lazy and keeps its chunks. Dates without a baseline are NaN. The
+    baseline can be lazy too.
+
+    Parameters:
+        - data (xr.DataArray): data with a `time` dimension.
+        - baseline (xr.Dataset): baselines (see `climatology`).
+        - decades (np.array): decade of each date. If `None`, the
+          day-of-year baseline is used.
+
+    Returns: xr.DataArray
+    """
+
+    dims = data.dims
+    data = data.transpose('time', ...)
+    space_dims = list(data.dims[1:])
+    values = data.data
+
+    days = baseline.dayofyear.values
+    codes = pd.Index(days).get_indexer(data.time.dt.dayofyear.values)
+
+    if decades is None:
+        table = baseline['doy_mean'].transpose('dayofyear', *space_dims)
+    else:
+        table = baseline['decade_doy_mean'].transpose('decade',
+                                                      'dayofyear',
+                                                      *space_dims)
+        decade_codes = pd.Index(baseline.decade.values).get_indexer(decades)
+        codes = np.where((codes >= 0) & (decade_codes >= 0),
+                         decade_codes * len(days) + codes,
+                         -1)
+
+    table = table.data.reshape((-1, ) + values.shape[1:])
+    # Last row for dates without a baseline
+    missing = np.full((1, ) + values.shape[1:], np.nan)
+    if isinstance(table, da.Array):
+        table = da.concatenate([table, missing])
+    else:
+        table = np.concatenate([table, missing])
+    codes[codes < 0] = table.shape[0] - 1
+
+    if np.issubdtype(values.dtype, np.floating):
+        table = table.astype(values.dtype)
+
+    if isinstance(values, da.Array) or isinstance(table, da.Array):
+        values = da.asarray(values)
+        table = da.asarray(table).rechunk(((table.shape[0], ), ) +
+                                          values.chunks[1:])
+        space = ''.join(chr(ord('a') + i) for i in range(values.ndim - 1))
+        result = da.blockwise(
+            _subtract_baseline, 't' + space,
+            values, 't' + space,
+            da.from_array(codes, chunks=(values.chunks[0], )), 't',
+            table, 'g' + space,
+            concatenate=True,
+            dtype=np.result_type(values.dtype, table.dtype)
+        )
+    else:
+        result = _subtract_baseline(values, codes, table)
+
+    return data.copy(data=result).transpose(*dims)
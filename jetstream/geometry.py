@@ -0,0 +1,188 @@
+"""
+Grid geometry (grid sizes and cell areas) cached by grid.
+
+The geometry only depends on the latitude and longitude coordinates, so it is
+computed once per grid and reused by all the time windows and products that
+share it. Geometries are kept in memory and, if a cache directory is given,
+saved to disk as `<key>.npz` files, where the key is a hash of the
+coordinates.
+"""
+
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+# In-memory geometries, keyed by `grid_key`
+_GEOMETRY_CACHE = {}
+
+
+def grid_key(lat, lon, r_earth):
+    """ Hash of the grid coordinates and Earth radius
+
+    Returns: str with the SHA-256 hex digest.
+    """
+
+    sha = hashlib.sha256()
+    for values in (lat, lon, [r_earth]):
+        sha.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+        sha.update(b'|')
+
+    return sha.hexdigest()
+
+
+def coordinate_spacing(values):
+    """ Spacing of a regular coordinate in degrees
+
+    If the differences between values are not exactly equal, the mean of the
+    distinct differences is used.
+    """
+
+    diff = np.unique(np.diff(values))
+
+    if len(diff) != 1:
+        diff = np.mean(diff)
+
+    return np.abs(np.squeeze(diff))
+
+
+def row_spacing(lat):
+    """ Latitude spacing of each row in degrees
+
+    Row edges are the midpoints between rows, and the first and last rows are
+    as wide as the distance to their neighbour. This gives the grid spacing
+    for regular grids and the row widths for irregular (e.g. Gaussian) grids.
+
+    Returns: np.array with one value per latitude.
+    """
+
+    lat = np.asarray(lat, dtype=np.float64)
+    mid = (lat[1:] + lat[:-1]) / 2
+    edges = np.concatenate([[lat[0] - (mid[0] - lat[0])],
+                            mid,
+                            [lat[-1] + (lat[-1] - mid[-1])]])
+
+    return np.abs(np.diff(edges))
+
+
+class GridGeometry(object):
+    """ Grid sizes and cell areas of a latitude/longitude grid
+
+    Grids with a regular latitude spacing (up to floating point noise) have a
+    scalar `lat_grid_size`. Irregular grids, like Gaussian grids, have the
+    width of each row instead.
+    """
+
+    def __init__(self, lat, lon, r_earth, lat_grid_size=None,
+                 lon_grid_size=None, cell_area=None):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.r_earth = r_earth
+
+        if lat_grid_size is None:
+            lat_grid_size = coordinate_spacing(self.lat)
+            if not np.allclose(row_spacing(self.lat), lat_grid_size):
+                lat_grid_size = row_spacing(self.lat)
+        self.lat_grid_size = lat_grid_size
+
+        if lon_grid_size is None:
+            lon_grid_size = coordinate_spacing(self.lon)
+        self.lon_grid_size = lon_grid_size
+
+        if cell_area is None:
+            cell_area = self.area_from_latitude(self.lat,
+                                                self.lat_grid_size,
+                                                self.lon_grid_size,
+                                                self.r_earth)
+        self.cell_area = cell_area
+
+    @property
+    def is_regular(self):
+        return np.ndim(self.lat_grid_size) == 0
+
+    @staticmethod
+    def area_from_latitude(latitude, lat_grid_size, lon_grid_size, r_earth):
+        """ Area of the grid cells at `latitude` in squared kilometers
+        """
+
+        DPHI = lat_grid_size * np.pi / 180.0
+        DLAMBDA = lon_grid_size * np.pi / 180.0
+
+        return ((r_earth)**2 * np.cos(np.deg2rad(latitude)) * DPHI *
+                DLAMBDA)
+
+    def save(self, path):
+        """ Save the geometry as a `.npz` file
+
+        The file is written to a temporary file of its own and renamed, so
+        processes saving the same geometry at the same time do not clash.
+        """
+
+        fd, tmp_path = tempfile.mkstemp(suffix='.npz',
+                                        dir=os.path.dirname(path) or '.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f,
+                         lat=self.lat,
+                         lon=self.lon,
+                         r_earth=self.r_earth,
+                         lat_grid_size=self.lat_grid_size,
+                         lon_grid_size=self.lon_grid_size,
+                         cell_area=self.cell_area)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """ Load a geometry saved with `save`
+        """
+
+        with np.load(path) as f:
+            lat_grid_size = f['lat_grid_size']
+            if lat_grid_size.ndim == 0:
+                lat_grid_size = lat_grid_size[()]
+
+            return cls(f['lat'],
+                       f['lon'],
+                       f['r_earth'][()],
+                       lat_grid_size=lat_grid_size,
+                       lon_grid_size=f['lon_grid_size'][()],
+                       cell_area=f['cell_area'])
+
+
+def grid_geometry(lat, lon, r_earth, cache_dir=None):
+    """ Cached geometry of a latitude/longitude grid
+
+    Parameters:
+        - lat (np.array): latitude coordinate.
+        - lon (np.array): longitude coordinate.
+        - r_earth (float): Earth radius in kilometers.
+        - cache_dir (str): directory to save and load geometries. If `None`,
+          geometries are only cached in memory.
+
+    Returns: GridGeometry
+    """
+
+    key = grid_key(lat, lon, r_earth)
+
+    if key in _GEOMETRY_CACHE:
+        return _GEOMETRY_CACHE[key]
+
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, f'{key}.npz')
+
+    if path is not None and os.path.exists(path):
+        geometry = GridGeometry.load(path)
+    else:
+        geometry = GridGeometry(lat, lon, r_earth)
+        # Another process may have saved the same geometry meanwhile
+        if path is not None and not os.path.exists(path):
+            os.makedirs(cache_dir, exist_ok=True)
+            geometry.save(path)
+
+    _GEOMETRY_CACHE[key] = geometry
+
+    return geometry
@@ -0,0 +1,190 @@
+"""
+Run manifest to resume pipeline runs by time window.
+
+The manifest is a JSON file saved next to the outputs of a product. Each
+processed time window records a fingerprint of the inputs and run options,
+and the size and checksum of each output file. A window is complete if its
+fingerprint did not change and all its outputs still match their checksums.
+
+Zarr stores are shared by all the windows of a product and change every time
+a window is written, so instead of checksummed they are checked to be
+complete stores (with consolidated metadata) that still hold all the dates
+the window wrote.
+"""
+
+import os
+import glob
+import json
+import hashlib
+import xarray as xr
+from datetime import datetime
+
+
+def file_checksum(path, block_size=2**20):
+    """ SHA-256 checksum of a file read in blocks of `block_size` bytes
+    """
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+
+def is_store(path):
+    """ Check if an output is a Zarr store (a directory) instead of a file
+    """
+
+    return str(path).endswith('.zarr') or os.path.isdir(path)
+
+
+def store_dates(path, start_date, end_date):
+    """ Number of dates of a Zarr store from `start_date` to `end_date`
+    (both included)
+    """
+
+    with xr.open_zarr(path) as store:
+        times = store.indexes['time']
+
+    return int(((times >= start_date) & (times <= end_date)).sum())
+
+
+def input_fingerprint(path_to_files, **options):
+    """ Fingerprint of the input files and run options
+
+    Input files are identified by path, size and modification time, so the
+    fingerprint is cheap to compute even for large file sets.
+
+    Parameters:
+        - path_to_files (str, pathlib.Path or list): input files. Strings
+          are expanded as glob patterns.
+        - options: run options that change the outputs (e.g. subset, season
+          or temperature interval).
+
+    Returns: str with the SHA-256 hex digest.
+    """
+
+    if isinstance(path_to_files, (list, tuple)):
+        paths = [str(p) for p in path_to_files]
+    else:
+        paths = sorted(glob.glob(str(path_to_files))) or [str(path_to_files)]
+
+    files = []
+    for path in paths:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            files.append([path, stat.st_size, stat.st_mtime])
+        else:
+            files.append([path, None, None])
+
+    fingerprint = json.dumps({'files': files, 'options': options},
+                             sort_keys=True,
+                             default=str)
+
+    return hashlib.sha256(fingerprint.encode()).hexdigest()
+
+
+class RunManifest(object):
+    """ Processed time windows and outputs of a product
+    """
+
+    def __init__(self, path_to_manifest):
+        self.path = path_to_manifest
+
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.windows = json.load(f)
+        else:
+            self.windows = {}
+
+    def save(self):
+        """ Write the manifest atomically to avoid partial files if the job
+        dies while writing
+        """
+
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.windows, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def is_complete(self, window, fingerprint, output_files):
+        """ Check if a time window was processed with the same inputs and its
+        outputs are complete and valid
+
+        Parameters:
+            - window (str): time window label.
+            - fingerprint (str): input fingerprint from `input_fingerprint`.
+            - output_files (dict): output name and path of the window outputs.
+
+        Returns: bool
+        """
+
+        entry = self.windows.get(window)
+        if entry is None or entry['fingerprint'] != fingerprint:
+            return False
+
+        for name, path in output_files.items():
+            output = entry['outputs'].get(name)
+            if output is None or output['path'] != str(path):
+                return False
+            if not os.path.exists(path):
+                return False
+            if output.get('store'):
+                if not os.path.exists(os.path.join(path, '.zmetadata')):
+                    return False
+                # The store may have been recreated without the window
+                if output.get('n_dates') is None:
+                    return False
+                try:
+                    n_dates = store_dates(path, *output['time_range'])
+                except (OSError, KeyError, ValueError):
+                    return False
+                if n_dates != output['n_dates']:
+                    return False
+                continue
+            if os.path.getsize(path) != output['size']:
+                return False
+            if file_checksum(path) != output['sha256']:
+                return False
+
+        return True
+
+    def record(self, window, fingerprint, output_files, time_range=None):
+        """ Add a processed time window with its outputs and save the manifest
+
+        Parameters:
+            - window (str): time window label.
+            - fingerprint (str): input fingerprint from `input_fingerprint`.
+            - output_files (dict): output name and path of the window outputs.
+            - time_range (tuple): first and last date of the window. Needed
+              to check Zarr outputs, which hold the dates of all windows.
+        """
+
+        outputs = {}
+        for name, path in output_files.items():
+            if is_store(path):
+                outputs[name] = {'path': str(path), 'store': True}
+                if time_range is not None:
+                    outputs[name]['time_range'] = [str(d) for d in time_range]
+                    outputs[name]['n_dates'] = store_dates(path, *time_range)
+            else:
+                outputs[name] = {
+                    'path': str(path),
+                    'size': os.path.getsize(path),
+                    'sha256': file_checksum(path),
+                }
+
+        self.windows[window] = {
+            'fingerprint': fingerprint,
+            'completed': datetime.now().isoformat(),
+            'outputs': outputs
+        }
+        self.save()
+
+    def invalidate(self, window):
+        """ Remove a time window from the manifest
+        """
+
+        if self.windows.pop(window, None) is not None:
+            self.save()
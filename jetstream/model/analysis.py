@@ -1,4 +1,4 @@
-from jetstream.model.template import Template
+from jetstream.model.template import Template, subset_space
 
 class Analysis(Template):
     """ Methods template for reanalysis data
@@ -9,6 +9,9 @@ class Analysis(Template):
     def cut(self, array_obj):
         """ Wrapper function to slice xarray using a dictionary
 
+        Time is sliced with `sel` and latitude and longitude are subset by
+        index (see `jetstream.model.template.subset_space`).
+
         Args:
         xr_array (xr.DataArray or xr.Dataset)
 
@@ -21,11 +24,7 @@ class Analysis(Template):
         }
 
         xr_data = array_obj.sel(time=valid_keys['time'])
-
-        if 'lat' in valid_keys.keys():
-            xr_data = xr_data.where(array_obj.lat > valid_keys['lat'], drop=True)
-        if 'lon' in valid_keys.keys():
-            xr_data = xr_data.where(array_obj.lat > valid_keys['lat'], drop=True)
+        xr_data = subset_space(xr_data, valid_keys)
 
         return xr_data.squeeze()
 
@@ -0,0 +1,306 @@
+"""
+NumPy block kernels used by `jetstream.model.template`
+
+All functions in this module take plain NumPy blocks with time as the leading
+axis (or any number of leading axes), so they can be mapped over dask chunks
+with `xr.apply_ufunc` or `dask.array.map_blocks` without communication between
+blocks.
+"""
+
+import numpy as np
+
+
+def bucket_precision(interval):
+    """ Decimal precision `pd.cut` uses to format the bucket labels
+
+    Parameters:
+        - interval (float): temperature bucket size.
+
+    Returns: int with the number of decimals.
+    """
+
+    for precision in range(20):
+        if np.around(interval, precision) == interval:
+            break
+
+    return precision
+
+
+def bucket_index(temp, temp_lower, interval, dtype=np.int16, n_buckets=None):
+    """ Integer temperature bucket for each value
+
+    Buckets are right-closed intervals starting at `temp_lower`, with the
+    lowest edge included, which reproduces the `pd.cut(...,
+    include_lowest=True)` bins in `Template._bucket_builder_ddf`. Missing
+    values get the bucket -1.
+
+    Parameters:
+        - temp (np.array): temperature values.
+        - temp_lower (np.array): lower edge of the first bucket, broadcastable
+          against `temp`.
+        - interval (float): temperature bucket size.
+        - dtype (np.dtype): integer dtype of the bucket codes. The compact
+          int16 codes hold up to 32767 buckets.
+        - n_buckets (int): if given, values above the last bucket are placed
+          in the last bucket, as values below `temp_lower` are placed in the
+          first one (for fixed bin edges).
+
+    Returns: np.array of `dtype` with the same shape as `temp`.
+    """
+
+    bucket = np.ceil((temp - temp_lower) / interval) - 1
+    bucket = np.maximum(bucket, 0)
+    if n_buckets is not None:
+        bucket = np.minimum(bucket, n_buckets - 1)
+    bucket = np.where(np.isnan(bucket), -1, bucket)
+
+    return bucket.astype(dtype)
+
+
+def bucket_label(bucket_idx, temp_lower, interval):
+    """ Temperature bucket label (left edge) as built by `pd.cut`
+
+    `pd.cut` shifts the left edge of the first bucket down by one unit of the
+    label precision when `include_lowest=True`, so the first label is not
+    `temp_lower` but `temp_lower - 10 ** -precision`.
+
+    Parameters:
+        - bucket_idx (np.array): bucket indices. Negative values get NaN.
+        - temp_lower (np.array): lower edge of the first bucket, broadcastable
+          against `bucket_idx`.
+        - interval (float): temperature bucket size.
+
+    Returns: np.array with the broadcasted shape of the inputs.
+    """
+
+    precision = bucket_precision(interval)
+    labels = np.around(temp_lower + interval * bucket_idx, precision)
+    labels = np.where(bucket_idx == 0, labels - 10.0 ** -precision, labels)
+
+    return np.where(bucket_idx >= 0, labels, np.nan)
+
+
+def bucket_histogram(bucket_idx, area, n_buckets):
+    """ Area-weighted histogram of temperature buckets per timestep
+
+    All timesteps in the block are accumulated with a single `np.bincount`
+    by offsetting the bucket indices of each timestep.
+
+    Parameters:
+        - bucket_idx (np.array): bucket indices with shape (..., lat, lon).
+        - area (np.array): grid cell area per latitude with shape (lat,).
+        - n_buckets (int): number of buckets.
+
+    Returns: np.array with shape (..., n_buckets) with the area per bucket.
+    """
+
+    lead_shape = bucket_idx.shape[:-2]
+    n_steps = int(np.prod(lead_shape))
+    weights = np.broadcast_to(np.asarray(area)[:, np.newaxis],
+                              bucket_idx.shape[-2:]).ravel()
+    bucket_idx = bucket_idx.reshape(n_steps, -1)
+    weights = np.broadcast_to(weights, bucket_idx.shape)
+
+    offsets = np.arange(n_steps)[:, np.newaxis] * n_buckets
+    valid = bucket_idx >= 0
+    hist = np.bincount((bucket_idx + offsets)[valid],
+                       weights=weights[valid],
+                       minlength=n_steps * n_buckets)
+
+    return hist.reshape(lead_shape + (n_buckets,))
+
+
+def cumulative_bucket_area(hist):
+    """ Cumulative area along the bucket axis
+
+    Empty buckets are set to NaN, as they do not appear in a group-by over
+    the gridpoint data.
+
+    Parameters:
+        - hist (np.array): area per bucket with buckets in the last axis.
+
+    Returns: np.array with the same shape as `hist`.
+    """
+
+    cdf_areas = np.cumsum(hist, axis=-1)
+
+    return np.where(hist > 0, cdf_areas, np.nan)
+
+
+def bucket_lookup(table, bucket_idx):
+    """ Look up a per-timestep bucket table for each grid cell
+
+    Parameters:
+        - table (np.array): values per bucket with shape (..., bucket).
+        - bucket_idx (np.array): bucket indices with shape (..., lat, lon).
+          Cells with a negative bucket get NaN.
+
+    Returns: np.array with the same shape as `bucket_idx`.
+    """
+
+    lead_shape = bucket_idx.shape[:-2]
+    n_steps = int(np.prod(lead_shape))
+    flat_idx = bucket_idx.reshape(n_steps, -1)
+    flat_table = np.broadcast_to(table, lead_shape + table.shape[-1:])
+    flat_table = flat_table.reshape(n_steps, -1)
+
+    values = np.take_along_axis(flat_table,
+                                np.clip(flat_idx, 0, None),
+                                axis=-1)
+    values = np.where(flat_idx >= 0, values, np.nan)
+
+    return values.reshape(bucket_idx.shape)
+
+
+def interp_temp_ref(cdf_eff_lat, temp_buckets, latitudes, dtype=np.float64):
+    """ Batched interpolation of the reference temperature (t_ref)
+
+    Vectorized version of `Template.vectorized_temp_ref` for a block of
+    timesteps. Each row interpolates the latitudes in its own (NaN-free)
+    cumulative effective latitude curve with the same rules as `np.interp`:
+    values outside the curve take the temperature of the closest end.
+
+    Parameters:
+        - cdf_eff_lat (np.array): cumulative effective latitudes with shape
+          (..., bucket).
+        - temp_buckets (np.array): temperature bucket labels, broadcastable
+          against `cdf_eff_lat`.
+        - latitudes (np.array): latitudes to interpolate with shape (lat,).
+        - dtype (np.dtype): dtype of the output. The interpolation is done
+          in float64.
+
+    Returns: np.array with shape (..., lat).
+    """
+
+    lead_shape = cdf_eff_lat.shape[:-1]
+    n_steps = int(np.prod(lead_shape))
+    latitudes = np.asarray(latitudes)
+
+    # Flip curves to have increasing latitudes, and move valid values to the
+    # front of each row keeping their order.
+    xp = cdf_eff_lat.reshape(n_steps, -1)[:, ::-1]
+    fp = np.broadcast_to(temp_buckets, cdf_eff_lat.shape)
+    fp = fp.reshape(n_steps, -1)[:, ::-1]
+
+    valid = ~np.isnan(xp)
+    order = np.argsort(~valid, axis=1, kind='stable')
+    xp = np.take_along_axis(xp, order, axis=1)
+    fp = np.take_along_axis(fp, order, axis=1)
+    last = valid.sum(axis=1, keepdims=True) - 1
+
+    # Index of the last curve point below or at each latitude
+    below = (xp[:, np.newaxis, :] <= latitudes[np.newaxis, :, np.newaxis])
+    j = np.clip(below.sum(axis=-1) - 1, 0, np.maximum(last, 0))
+    j_next = np.minimum(j + 1, np.maximum(last, 0))
+
+    x0 = np.take_along_axis(xp, j, axis=1)
+    x1 = np.take_along_axis(xp, j_next, axis=1)
+    f0 = np.take_along_axis(fp, j, axis=1)
+    f1 = np.take_along_axis(fp, j_next, axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (f1 - f0) / (x1 - x0)
+        t_ref = np.where((latitudes <= x0) | (j == j_next),
+                         f0,
+                         slope * (latitudes - x0) + f0)
+
+    t_ref = np.where(last >= 0, t_ref, np.nan)
+
+    return t_ref.reshape(lead_shape + latitudes.shape).astype(dtype,
+                                                              copy=False)
+
+
+def window_bucket_index(temp, temp_lower, temp_upper, interval,
+                        dtype=np.int16):
+    """ Integer temperature bucket for each value in moving window mode
+
+    Bins are `np.arange(temp_lower, temp_upper, interval)` for the window
+    ending in each timestep, and values are placed with `np.digitize`, so the
+    bucket index is the position of the first bin edge above the value.
+    Values above the last bin edge, missing values and timesteps without a
+    complete window get the bucket -1.
+
+    Parameters:
+        - temp (np.array): temperature values.
+        - temp_lower (np.array): floor of the window minimum, broadcastable
+          against `temp`.
+        - temp_upper (np.array): ceil of the window maximum, broadcastable
+          against `temp`.
+        - interval (float): temperature bucket size.
+        - dtype (np.dtype): integer dtype of the bucket codes.
+
+    Returns: np.array of `dtype` with the same shape as `temp`.
+    """
+
+    n_bins = np.ceil((temp_upper - temp_lower) / interval)
+    bucket = np.floor((temp - temp_lower) / interval) + 1
+    bucket = np.where(bucket < n_bins, bucket, np.nan)
+    bucket = np.where(np.isnan(bucket), -1, bucket)
+
+    return bucket.astype(dtype)
+
+
+def window_bucket_label(bucket_idx, temp_lower, interval):
+    """ Temperature bucket label in moving window mode
+
+    Labels are the bin edge returned by `np.digitize` for each value.
+
+    Parameters:
+        - bucket_idx (np.array): bucket indices. Negative values get NaN.
+        - temp_lower (np.array): floor of the window minimum, broadcastable
+          against `bucket_idx`.
+        - interval (float): temperature bucket size.
+
+    Returns: np.array with the broadcasted shape of the inputs.
+    """
+
+    labels = temp_lower + interval * bucket_idx
+
+    return np.where(bucket_idx >= 0, labels, np.nan)
+
+
+def scatter_values(positions, values, start, shape, dtype=np.float64):
+    """ Place values in a block of the grid by their flat position
+
+    Parameters:
+        - positions (np.array): flat positions in the full (time, lat, lon)
+          grid, in C order.
+        - values (np.array): values to place, with the same size as
+          `positions`.
+        - start (int): flat position of the first element of the block.
+        - shape (tuple): shape of the block.
+        - dtype (np.dtype): dtype of the block.
+
+    Returns: np.array with shape `shape`, and NaN where no value is placed.
+    """
+
+    block = np.full(int(np.prod(shape)), np.nan, dtype=dtype)
+    block[np.asarray(positions) - start] = values
+
+    return block.reshape(shape)
+
+
+def scatter_buckets(values, label_idx, n_labels):
+    """ Place values per bucket in a shared axis of bucket labels
+
+    Parameters:
+        - values (np.array): values per bucket with shape (..., bucket).
+        - label_idx (np.array): position of each bucket in the label axis,
+          broadcastable against `values`. Negative positions are dropped.
+        - n_labels (int): size of the label axis.
+
+    Returns: np.array with shape (..., n_labels), and NaN for labels without
+    a value.
+    """
+
+    lead_shape = values.shape[:-1]
+    n_steps = int(np.prod(lead_shape))
+    values = values.reshape(n_steps, -1)
+    label_idx = np.broadcast_to(label_idx, lead_shape + values.shape[-1:])
+    label_idx = label_idx.reshape(n_steps, -1)
+
+    scattered = np.full((n_steps, n_labels), np.nan)
+    rows, buckets = np.nonzero(label_idx >= 0)
+    scattered[rows, label_idx[rows, buckets]] = values[rows, buckets]
+
+    return scattered.reshape(lead_shape + (n_labels, ))
@@ -1,8 +1,8 @@
 import cftime
+import functools
 import xarray as xr
-from descriptors import cachedproperty
 from distributed.client import _get_global_client
-from jetstream.model.template import Template
+from jetstream.model.template import Template, subset_space
 
 
 class Model(Template):
@@ -10,21 +10,17 @@ class Model(Template):
     """
     temp_var = 'tas'
 
-    @cachedproperty
-    def data_array(self):
+    def open_data_array(self):
         """ Lazy load model/analysis data into memory. 
         """
 
-
-        xr_data = xr.open_mfdataset(self.path_to_files,
-                                    chunks=self.chunks,
-                                    parallel=True)
-
-        if not all(x in list(xr_data.coords) for x in self.DIMS):
-            xr_data = xr_data.rename({
-                'latitude': 'lat',
-                'longitude': 'lon',
-            })
+        xr_data = xr.open_mfdataset(
+            self.path_to_files,
+            chunks=self.chunk_plan,
+            parallel=True,
+            preprocess=functools.partial(self.preprocess,
+                                         subset_dict=self.subset_dict)
+        )
 
         if isinstance(xr_data.time.values[0], cftime._cftime.datetime):
             datetime_index = xr_data.indexes['time'].to_datetimeindex()
@@ -38,8 +34,7 @@ class Model(Template):
             print('Cut data')
 
         if self.season is not None:
-            xr_data = xr_data.where(xr_data.time.dt.season == self.season,
-                                    drop=True)
+            xr_data = self.select_season(xr_data)
 
         if self.rescale_longitude is True:
             xr_data = xr_data.assign_coords(lon=(((xr_data.lon + 180) % 360) -
@@ -51,7 +46,9 @@ class Model(Template):
         """ Wrapper function to slice GCM using a dictionary
 
         Slice GCM with a user-defined dictionary and take only the first
-        elements of member_id or nband, if exists
+        elements of member_id or nband, if exists. Time is sliced with `sel`
+        and latitude and longitude are subset by index (see
+        `jetstream.model.template.subset_space`).
 
         Args:
         xr_array (xr.DataArray or xr.Dataset)
@@ -70,10 +67,6 @@ class Model(Template):
 
         xr_data = array_obj.sel(time=valid_keys['time'])
         xr_data = xr_data.drop(other_coords)
-
-        if 'lat' in valid_keys.keys():
-            xr_data = xr_data.where(xr_data.lat > valid_keys['lat'], drop=True)
-        if 'lon' in valid_keys.keys():
-            xr_data = xr_data.where(xr_data.lat > valid_keys['lat'], drop=True)
+        xr_data = subset_space(xr_data, valid_keys)
 
         return xr_data.squeeze()
@@ -1,16 +1,61 @@
 import os
 import sys
+import glob
 import dask
+import dask.array as da
+import dask.dataframe as dd
 import pathlib
+import functools
+import zarr
 import xarray as xr
 import numpy as np
 import pandas as pd
 import bottleneck as bn
+from contextlib import nullcontext
 from datetime import datetime
 from dask.diagnostics import ProgressBar
+from dask.utils import parse_bytes
 from descriptors import cachedproperty
+from distributed import Lock
 from distributed.client import _get_global_client
 from abc import ABC, abstractmethod
+from jetstream import geometry
+from jetstream.model import kernels
+from jetstream.profiling import StageProfiler, profiled
+
+def subset_space(xr_data, subset_dict):
+    """ Subset latitude and longitude by index
+
+    A slice selects the coordinate range with `sel`, and a number keeps the
+    coordinates greater than it (e.g. `{'lat': 20}` keeps the latitudes north
+    of 20°) with `isel`. Dimensions already inside the subset are left
+    untouched, so subsetting twice is free.
+
+    Parameters:
+        - xr_data (xr.Dataset or xr.DataArray): data with `lat` and `lon`.
+        - subset_dict (dict): subset with optional `lat` and `lon` keys.
+
+    Returns: xr.Dataset or xr.DataArray
+    """
+
+    for dim in ['lat', 'lon']:
+        if dim not in subset_dict or dim not in xr_data.dims:
+            continue
+
+        value = subset_dict[dim]
+        if isinstance(value, slice):
+            index = xr_data.get_index(dim).slice_indexer(value.start,
+                                                         value.stop,
+                                                         value.step)
+            index = np.arange(xr_data.sizes[dim])[index]
+        else:
+            index = np.flatnonzero(xr_data[dim].values > value)
+
+        if len(index) < xr_data.sizes[dim]:
+            xr_data = xr_data.isel({dim: index})
+
+    return xr_data
+
 
 class Template(ABC):
     """ Abstract class to process and calculate metrics in climate data products
@@ -21,10 +66,48 @@ class Template(ABC):
      - t_reference
      - t_prime
      Different data classes can be adapted using this class as a template. 
+
+    Two engines are available to calculate the effective latitudes. The
+    `dataframe` engine (default) flattens the data into a dask DataFrame and
+    uses group-by and merge operations, while the `array` engine works
+    directly on NumPy blocks of the data array.
+
+    With `profile=True`, each pipeline stage is timed with its dask task
+    count, bytes read/written and peak memory, and `pipeline_methods` writes
+    a JSON report (and dask performance reports if a client exists) next to
+    its outputs. Lazy stages are persisted as they are profiled, so each
+    stage carries its own compute time, at the cost of keeping the stage
+    results in memory.
+
+    With `precision='float32'`, temperatures, cell areas, effective
+    latitudes and t-prime are kept in float32 to halve memory and I/O.
+    Area histograms are still accumulated in float64.
+
+    With `temp_bounds`, the temperature bin edges are fixed for the whole
+    run, from physical bounds (`(lower, upper)`) or from a single global
+    pass over the instance data (`'global'`), instead of the daily minimum.
+    All dates then share the same bucket axis. To share the axis between
+    time windows, pass the same `(lower, upper)` bounds to all of them.
+
+    With `chunks='auto'`, the chunks used to open the files are planned from
+    the files and the memory of the dask workers (see `chunk_plan`).
+
+    With `fused=True`, `pipeline_methods` builds the t-prime and effective
+    latitude outputs from one graph and writes them with a single
+    `dask.compute`, so the input files are bucketed once. The bucket edges
+    need the daily minimum and maximum first (see `temperature_bounds`), so
+    the input files are read twice, or once with fixed `(lower, upper)`
+    `temp_bounds`.
     """
 
     DIMS = ['time', 'lat', 'lon']
+    ENGINES = ['dataframe', 'array']
+    OUTPUT_FORMATS = ['netcdf', 'zarr']
+    PRECISIONS = ['float64', 'float32']
     R_EARTH = 6367.47
+    # Options used to open the dataset (see `dataset_key`)
+    DATASET_OPTIONS = ['path_to_files', 'subset_dict', 'season',
+                       'rescale_longitude']
     temp_var = ''
 
     def __init__(self,
@@ -35,7 +118,15 @@ class Template(ABC):
                  moving_window_size=None,
                  season=None,
                  rescale_longitude=False,
-                 chunks={'time': 10}):
+                 chunks={'time': 10},
+                 engine='dataframe',
+                 output_format='netcdf',
+                 profile=False,
+                 fused=False,
+                 geometry_cache=None,
+                 target_chunk_bytes=None,
+                 precision='float64',
+                 temp_bounds=None):
         self.path_to_files = path_to_files
         self.path_to_save = path_to_save_files
         self.temp_interval_size = temp_interval_size
@@ -44,6 +135,36 @@ class Template(ABC):
         self.rescale_longitude = rescale_longitude
         self.subset_dict = subset_dict
         self.chunks = chunks
+        self.target_chunk_bytes = target_chunk_bytes
+
+        if precision not in self.PRECISIONS:
+            raise ValueError(f'{precision} is not a valid precision: '
+                             f'{self.PRECISIONS}')
+        self.precision = precision
+        self.dtype = np.dtype(precision)
+
+        if temp_bounds is not None and moving_window_size is not None:
+            raise ValueError('temp_bounds can not be used with moving windows')
+        if temp_bounds is not None and temp_bounds != 'global':
+            temp_bounds = tuple(temp_bounds)
+        self.temp_bounds = temp_bounds
+
+        if engine not in self.ENGINES:
+            raise ValueError(f'{engine} is not a valid engine: {self.ENGINES}')
+        self.engine = engine
+
+        if output_format not in self.OUTPUT_FORMATS:
+            raise ValueError(f'{output_format} is not a valid output format: '
+                             f'{self.OUTPUT_FORMATS}')
+        self.output_format = output_format
+
+        self.profiler = StageProfiler() if profile else None
+        self.fused = fused
+        self.geometry_cache = geometry_cache
+
+        # Opened datasets, keyed by `self.dataset_key`
+        self._dataset_cache = {}
+        self.n_dataset_opens = 0
 
         if isinstance(self.path_to_files, pathlib.Path):
             self.product = self.path_to_files.stem
@@ -52,18 +173,34 @@ class Template(ABC):
         else:
             self.product = pathlib.Path(self.path_to_files).stem
 
+    def __setattr__(self, name, value):
+        # Changing how the dataset is opened invalidates the cached results
+        if name in self.DATASET_OPTIONS and '_dataset_cache' in self.__dict__:
+            self.clear_cache()
+        super().__setattr__(name, value)
+
     def __repr__(self):
         return f'''
                Climate product: {self.product} \n
                Grid size: ({self.lat_grid_size}, {self.lon_grid_size})
                '''
 
-    @cachedproperty
-    def pipeline_methods(self):
+    @property
+    def output_files(self):
+        """ Paths of the files written by `pipeline_methods`
+
+        NetCDF outputs have one file per time window, while Zarr outputs are a
+        single store per product where all time windows are written.
+
+        Returns: dict with the `t_prime` and `eff_lat` output paths.
+        """
 
         dir_save = self.build_save_dirs()
 
-        if self.subset_dict is not None:
+        if self.output_format == 'zarr':
+            filename_tref = f'{self.product}_t_prime.zarr'
+            filename_eff_lat = f'{self.product}_eff_lat.zarr'
+        elif self.subset_dict is not None:
             time_slice = self.subset_dict['time']
             filename_tref = f'{self.product}_t_prime_{time_slice.start}_{time_slice.stop}.nc4'
             filename_eff_lat = f'{self.product}_eff_lat_{time_slice.start}_{time_slice.stop}.nc4'
@@ -71,11 +208,375 @@ class Template(ABC):
             filename_tref = f'{self.product}_t_prime.nc4'
             filename_eff_lat = f'{self.product}_eff_lat.nc4'
 
-        self.t_prime_calculation.to_netcdf(os.path.join(dir_save, filename_tref))
-        self.effective_latitude_xr.to_netcdf(os.path.join(dir_save,filename_eff_lat))
+        return {
+            't_prime': os.path.join(dir_save, filename_tref),
+            'eff_lat': os.path.join(dir_save, filename_eff_lat)
+        }
+
+    @property
+    def profile_file(self):
+        """ Path of the profiling report written by `pipeline_methods`
+        """
+
+        if self.subset_dict is not None:
+            time_slice = self.subset_dict['time']
+            filename = f'{self.product}_profile_{time_slice.start}_{time_slice.stop}.json'
+        else:
+            filename = f'{self.product}_profile.json'
+
+        return os.path.join(self.build_save_dirs(), filename)
+
+    def profile_stage(self, name):
+        """ Context to profile a pipeline stage if profiling is enabled
+
+        Dask performance reports are saved next to the profiling report,
+        one per stage, if `path_to_save_files` is set.
+        """
+
+        if self.profiler is None:
+            return nullcontext()
+
+        if self.path_to_save is not None:
+            report_path = self.profile_file.replace('.json', f'_{name}.html')
+        else:
+            report_path = None
+
+        return self.profiler.stage(name, performance_report_path=report_path)
+
+    @cachedproperty
+    def pipeline_methods(self):
+
+        output_files = self.output_files
+
+        # Stages are built (and computed if profiling) before their writes
+        if self.fused:
+            t_prime = self.t_prime_calculation
+            eff_lat = self.effective_latitude_xr.to_dataset()
+            with self.profile_stage('write_outputs'):
+                writes = [
+                    self.write_output(t_prime,
+                                      output_files['t_prime'],
+                                      compute=False),
+                    self.write_output(eff_lat,
+                                      output_files['eff_lat'],
+                                      compute=False)
+                ]
+                dask.compute(*writes)
+        else:
+            t_prime = self.t_prime_calculation
+            with self.profile_stage('write_t_prime'):
+                self.write_output(t_prime, output_files['t_prime'])
+
+            eff_lat = self.effective_latitude_xr.to_dataset()
+            with self.profile_stage('write_eff_lat'):
+                self.write_output(eff_lat, output_files['eff_lat'])
+
+        if self.profiler is not None:
+            self.profiler.save(self.profile_file)
+
+    def write_output(self, dataset, path, compute=True):
+        """ Write a dataset in `self.output_format`
+
+        Parameters:
+            - dataset (xr.Dataset): data to write.
+            - path (str): path of the NetCDF file or the Zarr store.
+            - compute (bool): write the data now. If `False`, return a
+              `dask.delayed` object to write the data later.
+        """
+
+        if self.output_format == 'zarr':
+            return self.write_zarr(dataset, path, compute=compute)
+
+        return dataset.to_netcdf(path, compute=compute)
+
+    @staticmethod
+    def aligned_time_chunks(n_times, offset, store_chunk):
+        """ Time chunks of `n_times` dates written from `offset` in a store
+
+        The first chunk ends on the next chunk boundary of the store, and the
+        other chunks are the chunks of the store, so each dask chunk writes
+        to a single Zarr chunk and no two dask chunks write to the same one.
+
+        Returns: tuple of ints
+        """
+
+        first = min(n_times, store_chunk - offset % store_chunk)
+        rest = n_times - first
+        chunks = [first] + [store_chunk] * (rest // store_chunk)
+        if rest % store_chunk:
+            chunks.append(rest % store_chunk)
+
+        return tuple(chunks)
+
+    def write_zarr(self, dataset, store, compute=True):
+        """ Write a dataset into a Zarr store along time
+
+        The dates of `dataset` are appended to the store, or the store is
+        created if it does not exist. If the dates were already written (e.g.
+        a time window that is processed again), they are overwritten in place
+        with a region write. The store metadata is updated under a
+        `distributed.Lock` if a client exists, so time windows running at the
+        same time can write to the same store, and the data chunks are written
+        in parallel from the dask workers. Dates are not sorted in the store.
+
+        Dask chunks are aligned to the time chunks of the store from the
+        position of the first date (see `aligned_time_chunks`). The Zarr
+        chunks at the edges of a window can be shared with the windows next
+        to it, so the chunks are written under file locks next to the store
+        (`<store>.sync`).
+
+        Parameters:
+            - dataset (xr.Dataset): data with a `time` dimension.
+            - store (str): path to the Zarr store.
+            - compute (bool): write the data chunks now. If `False`, only the
+              metadata is written and a `dask.delayed` object is returned to
+              write the chunks later.
+        """
+
+        time_chunk = self.chunk_plan.get('time', -1)
+        if time_chunk == -1:
+            time_chunk = dataset.sizes['time']
+
+        client = _get_global_client()
+        lock = Lock(store) if client is not None else nullcontext()
+        synchronizer = zarr.ProcessSynchronizer(f'{store}.sync')
+
+        with lock:
+            if not os.path.exists(store):
+                dataset = dataset.chunk({
+                    'time': time_chunk,
+                    'lat': -1,
+                    'lon': -1
+                })
+                writes = dataset.to_zarr(store,
+                                         mode='w-',
+                                         consolidated=True,
+                                         synchronizer=synchronizer,
+                                         compute=False)
+            else:
+                stored = xr.open_zarr(store)
+                store_times = stored.indexes['time']
+                positions = store_times.get_indexer(dataset.indexes['time'])
+
+                time_var = [
+                    stored[var] for var in stored.data_vars
+                    if 'time' in stored[var].dims
+                ][0]
+                store_chunk = time_var.encoding['chunks'][
+                    time_var.dims.index('time')
+                ]
+
+                if (positions < 0).all():
+                    offset = len(store_times)
+                elif (np.diff(positions) == 1).all() and positions[0] >= 0:
+                    offset = positions[0]
+                else:
+                    raise ValueError(f'Dates partially overlap with {store}')
+
+                dataset = dataset.chunk({
+                    'time': self.aligned_time_chunks(dataset.sizes['time'],
+                                                     offset,
+                                                     store_chunk),
+                    'lat': -1,
+                    'lon': -1
+                })
+
+                if (positions < 0).all():
+                    writes = dataset.to_zarr(store,
+                                             append_dim='time',
+                                             consolidated=True,
+                                             synchronizer=synchronizer,
+                                             compute=False)
+                else:
+                    not_in_time = [
+                        var for var in dataset.variables
+                        if 'time' not in dataset[var].dims
+                    ]
+                    region = {'time': slice(positions[0], positions[-1] + 1)}
+                    writes = dataset.drop_vars(not_in_time).to_zarr(
+                        store,
+                        region=region,
+                        synchronizer=synchronizer,
+                        compute=False
+                    )
+
+        if not compute:
+            return writes
+
+        writes.compute()
+
+    @property
+    def input_files(self):
+        """ List of input files in `path_to_files`, with glob patterns expanded
+        """
+
+        if isinstance(self.path_to_files, (list, tuple)):
+            return [str(p) for p in self.path_to_files]
+
+        return sorted(glob.glob(str(self.path_to_files)))
+
+    @cachedproperty
+    def chunk_plan(self):
+        """ Chunks used to open the input files
+
+        If `self.chunks` is a dict, it is used as is. If it is 'auto', the
+        time chunk is planned from the first input file: the size of a
+        timestep of `self.temp_var` (dims and dtype), its chunking on disk,
+        and a target chunk size. The target is `self.target_chunk_bytes`
+        (the dask `array.chunk-size` setting by default), capped to a quarter
+        of the memory per thread of the dask workers if a client exists.
+        Latitude and longitude are never chunked, as the pipeline needs
+        complete dates in each block. The plan is printed.
+
+        Returns: dict with the chunks to pass to `xr.open_mfdataset`.
+        """
+
+        if self.chunks != 'auto':
+            return self.chunks
+
+        target = parse_bytes(self.target_chunk_bytes or
+                             dask.config.get('array.chunk-size'))
+
+        client = _get_global_client()
+        if client is not None:
+            workers = client.scheduler_info()['workers'].values()
+            thread_memory = [
+                w['memory_limit'] / w['nthreads'] for w in workers
+                if w['memory_limit']
+            ]
+            if thread_memory:
+                target = min(target, int(min(thread_memory) / 4))
+
+        with xr.open_dataset(self.input_files[0], decode_times=False) as ds:
+            temp = ds[self.temp_var]
+            n_times = temp.sizes['time']
+            step_bytes = temp.dtype.itemsize * temp.size // n_times
+            disk_chunks = temp.encoding.get('chunksizes')
+            if disk_chunks is not None:
+                disk_time = disk_chunks[temp.dims.index('time')]
+            else:
+                disk_time = 1
+
+        time_chunk = max(1, target // step_bytes)
+        # Read whole chunks from disk
+        time_chunk = max(disk_time, time_chunk // disk_time * disk_time)
+        time_chunk = int(min(time_chunk, n_times))
+
+        print(f'Chunk plan: time={time_chunk}, lat/lon not chunked '
+              f'({time_chunk * step_bytes / 2**20:.1f} MiB per chunk, target '
+              f'{target / 2**20:.1f} MiB, {disk_time} timesteps per chunk '
+              f'on disk)')
+
+        return {'time': time_chunk}
+
+    @property
+    def dataset_key(self):
+        """ Key identifying the opened dataset in the cache
+
+        The key changes if any of the options used to open and transform the
+        raw files (`path_to_files`, `subset_dict`, `season` and
+        `rescale_longitude`) changes in the instance.
+        """
+
+        if isinstance(self.path_to_files, (str, pathlib.Path)):
+            paths = (str(self.path_to_files), )
+        else:
+            paths = tuple(str(p) for p in self.path_to_files)
+
+        if self.subset_dict is not None:
+            subset = repr(sorted(self.subset_dict.items()))
+        else:
+            subset = None
+
+        return (paths, subset, self.season, self.rescale_longitude)
 
     @property
     def data_array(self) -> xr.Dataset:
+        """ Cached model/analysis dataset
+
+        The raw files are opened once per instance with `open_data_array`
+        and the result is kept for later accesses, so the pipeline methods
+        share the same dataset. `n_dataset_opens` counts how many times the
+        files have been opened. Use `clear_cache` to force a new open.
+
+        If an option that changes the dataset (`DATASET_OPTIONS`) is set,
+        or the key of the dataset changes (e.g. `subset_dict` is modified in
+        place), the cache is cleared, so all the cached results are rebuilt
+        from the new dataset.
+        """
+
+        key = self.dataset_key
+
+        if key not in self._dataset_cache:
+            # Results built from a previous dataset are stale
+            self.clear_cache()
+            with self.profile_stage('open_data_array'):
+                xr_data = self.open_data_array()
+
+            if self.precision == 'float32':
+                xr_data[self.temp_var] = xr_data[self.temp_var].astype(
+                    self.dtype
+                )
+
+            self._dataset_cache[key] = xr_data
+            self.n_dataset_opens += 1
+
+        return self._dataset_cache[key]
+
+    def clear_cache(self):
+        """ Invalidate the opened dataset and all cached pipeline results
+        """
+
+        self._dataset_cache.clear()
+
+        cached_attrs = [
+            name for name in self.__dict__
+            if any(name in vars(cls) for cls in type(self).__mro__)
+        ]
+        for name in cached_attrs:
+            del self.__dict__[name]
+
+    @staticmethod
+    def preprocess(xr_data, subset_dict=None):
+        """ Prepare each raw file as it is opened by `xr.open_mfdataset`
+
+        Coordinates are renamed to `lat` and `lon`, and the latitude and
+        longitude subsets of `subset_dict` are applied to each file before
+        concatenation (see `subset_space`), so only the needed hyperslabs are
+        read from disk.
+
+        Parameters:
+            - xr_data (xr.Dataset): dataset of a raw file.
+            - subset_dict (dict): subset of the product.
+
+        Returns: xr.Dataset
+        """
+
+        xr_data = xr_data.rename({
+            name: dim for name, dim in [('latitude', 'lat'),
+                                        ('longitude', 'lon')]
+            if name in xr_data.coords and dim not in xr_data.coords
+        })
+
+        if subset_dict is not None:
+            xr_data = subset_space(xr_data, subset_dict)
+
+        return xr_data
+
+    def select_season(self, xr_data):
+        """ Select the dates of `self.season` by index
+
+        Returns: xr.Dataset with the dates in the season.
+        """
+
+        in_season = xr_data.time.dt.season.values == self.season
+
+        if in_season.all():
+            return xr_data
+
+        return xr_data.isel(time=np.flatnonzero(in_season))
+
+    def open_data_array(self) -> xr.Dataset:
         """ Lazy load model/analysis data into memory and subsetting raw data
         using `self.subset_dict`
 
@@ -84,25 +585,26 @@ class Template(ABC):
         function names coordinates to common dimnesions, and then cut the data
         if a dict is passed to the class. It also re-scales longitude, which
         comes in 0 to 360 on must of climate products.
-        """
 
-        xr_data = xr.open_mfdataset(self.path_to_files,
-                                   chunks=self.chunks,
-                                    parallel=True)
+        Latitude and longitude are subset per file while opening (see
+        `preprocess`), and time and season are selected by index after the
+        files are combined, so no masked copies of the data are built.
+        """
 
-        if not all(x in list(xr_data.coords) for x in self.DIMS):
-            xr_data = xr_data.rename({
-                'latitude': 'lat',
-                'longitude': 'lon',
-            })
+        xr_data = xr.open_mfdataset(
+            self.path_to_files,
+            chunks=self.chunk_plan,
+            parallel=True,
+            preprocess=functools.partial(self.preprocess,
+                                         subset_dict=self.subset_dict)
+        )
 
         if self.subset_dict is not None:
             print(f'Cutting data using {self.subset_dict}')
             xr_data = self.cut(xr_data)
 
         if self.season is not None:
-            xr_data = xr_data.where(xr_data.time.dt.season == self.season,
-                                    drop=True)
+            xr_data = self.select_season(xr_data)
 
         if self.rescale_longitude is True:
             xr_data = xr_data.assign_coords(lon=(((xr_data.lon + 180) % 360) -
@@ -117,9 +619,13 @@ class Template(ABC):
         Thins property will yield a dask.dataframe that contain the
         `self.data_array` data with the temperature bining and latitudinal grid
         areas per each row. The bining can be either daily, by default, or use
-        a window set by `self.moving_window_size`. This process is right now
-        not very optimized, so it might take a while to process in large
-        datasets.
+        a window set by `self.moving_window_size`.
+
+        Temperature buckets (`temp_bucket`) are compact int16 codes counted
+        from the lower edge of each date (`temperature_bounds.temp_lower`),
+        with -1 for cells without a bucket. The bucket label (bin edge) of a
+        row is rebuilt from its code, the `temp_lower` of its date and
+        `temp_interval_size` (see `bucket_labels`).
 
         Returns:
             dask.datarame.DaskDataFrame
@@ -130,56 +636,30 @@ class Template(ABC):
             'time': pd.Series([], dtype='<M8[ns]'),
             'lat': pd.Series([], dtype='float'),
             'lon': pd.Series([], dtype='float'),
-            't2m': pd.Series([], dtype='float'),
-            'area_grid': pd.Series([], dtype='float'),
-            'temp_bucket': pd.Series([], dtype='float'),
+            self.temp_var: pd.Series([], dtype=self.dtype),
+            'area_grid': pd.Series([], dtype=self.dtype),
+            'temp_bucket': pd.Series([], dtype='int16'),
+            'grid_index': pd.Series([], dtype='int64'),
         })
 
-        self.data_array['area_grid'] = self._calculate_area_from_latitude(
-            self.data_array.lat
-        )
+        self.data_array['area_grid'] = self.cell_area_xr
+        self.data_array['grid_index'] = self.grid_index_xr
+        self._check_bucket_codes(self.n_buckets)
 
         # Calculate window operation if selected
         if self.moving_window_size is not None:
-            if isinstance(self.moving_window_size, int):
-                window_array = (
-                    self.data_array[self.temp_var].
-                    rolling(time=self.moving_window_size,
-                            center=False,
-                            min_periods=self.moving_window_size
-                            )
-                )
-            else:
-                raise NotImplementedError
-
-            window_arrays = []
-            for label, array_window in window_array:
-                bucket_array = self._create_bucket_window(
-                    w_arr=array_window,
-                    label_time=label)
-                window_arrays.append(bucket_array)
+            self.data_array['temp_bucket'] = self.bucket_index_xr
 
-            lazy_results = dask.compute(*window_arrays[self.moving_window_size:])
-            lazy_results_no_none = [r for r in lazy_results if r is not None]
-
-            self.data_array['temp_bucket'] = xr.concat(lazy_results_no_none,
-                                                       dim='time')
-
-            #return unified chunks since window changed chunks
-            return (
-                self.data_array
-                .unify_chunks()
-                .to_dask_dataframe(dim_order=self.DIMS)
-            )
+            return self.data_array.to_dask_dataframe(dim_order=self.DIMS)
 
         else:
-            # Yield dask.dataframe and process groupby operation
+            # Yield dask.dataframe and build buckets per partition. Each
+            # partition holds complete dates, so no shuffle is needed.
             array_ddf = self.data_array.to_dask_dataframe(dim_order=self.DIMS)
             array_ddf_transform = (
                 array_ddf
-                .groupby(['time'])
-                .apply(self._bucket_builder_ddf,
-                       meta=meta)
+                .map_partitions(self._bucket_builder_ddf,
+                                meta=meta)
             )
 
             return array_ddf_transform
@@ -196,37 +676,52 @@ class Template(ABC):
 
         pass
 
+    @cachedproperty
+    def grid_geometry(self):
+        """ Grid sizes and cell areas of the data grid
+
+        Geometries are cached by grid (see `jetstream.geometry`), so time
+        windows and products on the same grid share them. If
+        `geometry_cache` is set, they are also saved to that directory.
+        """
+
+        return geometry.grid_geometry(self.data_array.lat.values,
+                                      self.data_array.lon.values,
+                                      self.R_EARTH,
+                                      cache_dir=self.geometry_cache)
+
     @cachedproperty
     def lat_grid_size(self):
         """ Calculate grid size from model/analysis
+
+        Irregular grids (e.g. Gaussian grids) have the width of each row, as
+        a DataArray over latitude.
         """
-        lat_diff = np.unique(np.diff(self.data_array.lat))
 
-        if len(lat_diff) != 1:
-            lat_diff = np.mean(lat_diff)
+        grid_geometry = self.grid_geometry
+
+        if grid_geometry.is_regular:
+            return grid_geometry.lat_grid_size
 
-        return np.abs(lat_diff)
+        return xr.DataArray(grid_geometry.lat_grid_size,
+                            dims=['lat'],
+                            coords={'lat': self.data_array.lat})
 
     @cachedproperty
     def lon_grid_size(self):
         """ Calculate grid size from model/analysis
         """
-        lon_diff = np.unique(np.diff(self.data_array.lon))
 
-        if len(lon_diff) != 1:
-            lon_diff = np.mean(lon_diff)
-        return np.abs(lat_diff)
+        return self.grid_geometry.lon_grid_size
 
     @cachedproperty
-    def lon_grid_size(self):
-        """ Calculate grid size from model/analysis
+    def cell_area_xr(self):
+        """ Area of the grid cells per latitude, from the geometry cache
         """
-        lon_diff = np.unique(np.diff(self.data_array.lon))
 
-        if len(lon_diff) != 1:
-            lon_diff = np.mean(lon_diff)
-
-        return np.abs(lon_diff)
+        return xr.DataArray(self.grid_geometry.cell_area.astype(self.dtype),
+                            dims=['lat'],
+                            coords={'lat': self.data_array.lat})
 
     def _distributions_lat_eff(self, cdf_areas):
         """ Calculate cumulative distribution of effective latitudes (phi-effective)
@@ -259,29 +754,56 @@ class Template(ABC):
         -------
             Area per grid
         """
-        DPHI = self.lat_grid_size * np.pi / 180.0
-        DLAMBDA = self.lon_grid_size * np.pi / 180.0
+        return geometry.GridGeometry.area_from_latitude(latitude,
+                                                        self.lat_grid_size,
+                                                        self.lon_grid_size,
+                                                        self.R_EARTH)
+
+    @cachedproperty
+    def grid_index_xr(self):
+        """ Flat position of each grid cell in the (time, lat, lon) grid
 
-        return ((self.R_EARTH)**2 * np.cos(np.deg2rad(latitude)) * DPHI *
-                DLAMBDA)
+        The position is carried as a column in `data_array_dask_df`, so the
+        DataFrame can be placed back into the grid without reshaping.
 
-    def _bucket_builder_ddf(self, ddf):
-        """ Build temperature buckets using max and min in dataframe
+        Returns: xr.DataArray (time, lat, lon) of int64 chunked as the data.
         """
 
-        bins_left = np.vectorize(lambda x: x.left)
-        min_val = np.floor(ddf[self.temp_var].min())
-        max_val = np.ceil(ddf[self.temp_var].max())
-        offset_scale = max_val + 2
+        temp = self.data_array[self.temp_var].transpose(*self.DIMS)
+        n_cells = temp.shape[1] * temp.shape[2]
+
+        grid_index = da.arange(temp.size,
+                               chunks=tuple(c * n_cells
+                                            for c in temp.chunks[0]),
+                               dtype=np.int64)
+        grid_index = grid_index.reshape(temp.shape).rechunk(temp.chunks)
+
+        return xr.DataArray(grid_index,
+                            dims=self.DIMS,
+                            coords={dim: temp[dim] for dim in self.DIMS})
+
+    def _bucket_builder_ddf(self, ddf):
+        """ Build temperature buckets using the daily min in dataframe
+
+        Buckets are calculated arithmetically from the floor of the minimum
+        temperature of each date (or the fixed `self.temp_bounds`), with the
+        same bins than `pd.cut`, and stored as int16 codes. The dataframe can
+        hold several dates.
+        """
 
-        buckets = np.arange(min_val,
-                            max_val + offset_scale,
-                            self.temp_interval_size)
+        if self.temp_bounds is not None:
+            temp_lower = self.temperature_bounds.temp_lower.values[0]
+            n_buckets = self.n_buckets
+        else:
+            temp_lower = np.floor(
+                ddf.groupby('time')[self.temp_var].transform('min').values
+            )
+            n_buckets = None
 
-        bin_array = pd.cut(ddf[self.temp_var], 
-                           bins=buckets, 
-                           precision=0,
-                           include_lowest=True)
+        temp_bucket = kernels.bucket_index(ddf[self.temp_var].values,
+                                           temp_lower,
+                                           self.temp_interval_size,
+                                           n_buckets=n_buckets)
 
         df_ = pd.DataFrame({
             'time': ddf.time,
@@ -289,124 +811,424 @@ class Template(ABC):
             'lon': ddf.lon,
             self.temp_var: ddf[self.temp_var],
             'area_grid': ddf.area_grid,
-            'temp_bucket': bins_left(bin_array)
+            'temp_bucket': temp_bucket,
+            'grid_index': ddf.grid_index
         })
 
         return df_
 
-    @dask.delayed
-    def _create_bucket_window(self, w_arr, label_time):
-        ''' Lazy Build temperature buckets in a rolling xarray object
+    @cachedproperty
+    @profiled('temperature_bounds')
+    def temperature_bounds(self):
+        """ Daily minimum and maximum temperature and bucket edges
+
+        The floor of the daily minimum is the lower edge of the first
+        temperature bucket (`temp_lower`). If `self.moving_window_size` is
+        set, `temp_lower` and `temp_upper` are the floor and ceil of the
+        minimum and maximum over the window ending in each date, calculated
+        with moving reductions over the daily bounds. As in the original
+        window loop, the first `self.moving_window_size` dates have no edges.
+        Bounds are computed in a single reduction and are small (one value
+        per timestep).
+
+        If `self.temp_bounds` is set, the edges are the same for all dates:
+        the floor and ceil of the configured bounds, without reading the data,
+        or of the global minimum and maximum (`'global'`).
+
+        Returns: xr.Dataset with `temp_min`, `temp_max` and `temp_lower`, and
+        `temp_upper` for moving windows and fixed bounds.
+        """
 
-        Parameters:
-        ----------
-        - w_arr (xr.DataArray.rolling): A rolling object with the defined window
-          to calculate buckets
-        - label_time (pd.Timedelta or pd.datetime): A timestamp to identify the
-          start of the window. Usually, the `xr.DataArray.rolling` includes
-          labels per each start of the window if `center=False`.
+        temp = self.data_array[self.temp_var]
 
-        Returns:
-            dask.future
-        '''
+        if self.temp_bounds is not None:
+            if self.temp_bounds == 'global':
+                # Daily bounds share the reads of each chunk
+                temp_min, temp_max = dask.compute(temp.min(dim=['lat', 'lon']),
+                                                  temp.max(dim=['lat', 'lon']))
+                temp_min, temp_max = float(temp_min.min()), float(temp_max.max())
+            else:
+                temp_min, temp_max = self.temp_bounds
+
+            n_times = self.data_array.time.size
+            return xr.Dataset(
+                {
+                    'temp_min': ('time', np.full(n_times, float(temp_min))),
+                    'temp_max': ('time', np.full(n_times, float(temp_max))),
+                    'temp_lower': ('time',
+                                   np.full(n_times, np.floor(temp_min))),
+                    'temp_upper': ('time',
+                                   np.full(n_times, np.ceil(temp_max)))
+                },
+                coords={'time': self.data_array.time.values}
+            )
+        temp_min, temp_max = dask.compute(temp.min(dim=['lat', 'lon']),
+                                          temp.max(dim=['lat', 'lon']))
+
+        bounds = xr.Dataset({
+            'temp_min': temp_min,
+            'temp_max': temp_max,
+            'temp_lower': np.floor(temp_min)
+        })
+
+        if self.moving_window_size is not None:
+            if not isinstance(self.moving_window_size, int):
+                raise NotImplementedError
+
+            window = self.moving_window_size
+            complete = np.arange(temp_min.size) >= window
+
+            window_min = bn.move_min(temp_min.values,
+                                     window=window,
+                                     min_count=window)
+            window_max = bn.move_max(temp_max.values,
+                                     window=window,
+                                     min_count=window)
+
+            bounds['temp_lower'] = ('time',
+                                    np.where(complete,
+                                             np.floor(window_min),
+                                             np.nan))
+            bounds['temp_upper'] = ('time',
+                                    np.where(complete,
+                                             np.ceil(window_max),
+                                             np.nan))
+
+        return bounds
+
+    @cachedproperty
+    def date_buckets(self):
+        """ Number of temperature buckets of each date
+
+        Dates without bounds (e.g. dates before the first complete moving
+        window) have no buckets.
+
+        Returns: np.array of int with one value per date.
+        """
 
-        # calculate min and max for the aray_window
-        max_temp = np.ceil(w_arr.max().values)
-        min_temp = np.floor(w_arr.min().values)
-        label_str = pd.to_datetime(label_time.values).strftime('%Y-%m-%d')
+        bounds = self.temperature_bounds
 
-        if not any(np.isnan([max_temp, min_temp])):
-            bins = np.arange(min_temp,
-                             max_temp,
+        if self.moving_window_size is not None:
+            n_bins = np.ceil((bounds.temp_upper.values -
+                              bounds.temp_lower.values) /
                              self.temp_interval_size)
-            bins_left_labels = dict(enumerate(bins, 0))
-
-            buckets = np.digitize(w_arr.sel(time=label_str),
-                                  bins=bins)
-            buckets_w_labels = np.vectorize(bins_left_labels.get)(buckets)
-            buckets_arr = xr.DataArray(buckets_w_labels.squeeze(),
-                                       coords=[
-                                           ('lat', w_arr.lat),
-                                           ('lon', w_arr.lon)
-                                       ]).astype(np.float64)
-            buckets_arr = buckets_arr.assign_coords({'time': label_time})
+            return np.nan_to_num(n_bins).astype(int)
+
+        bucket_idx = kernels.bucket_index(bounds.temp_max.values,
+                                          bounds.temp_lower.values,
+                                          self.temp_interval_size,
+                                          dtype=np.int64)
+        return bucket_idx + 1
+
+    @cachedproperty
+    def n_buckets(self):
+        """ Number of temperature buckets needed to hold all timesteps
+
+        Bucket codes are int16, so a date can not have more than 32767
+        buckets (use a larger `temp_interval_size`).
+        """
+
+        n_buckets = int(self.date_buckets.max())
+        self._check_bucket_codes(n_buckets)
+
+        return n_buckets
+
+    @staticmethod
+    def _check_bucket_codes(n_buckets):
+        """ Raise a ValueError if `n_buckets` bucket codes do not fit in int16
+        """
+
+        if n_buckets > np.iinfo(np.int16).max:
+            raise ValueError(f'{n_buckets} temperature buckets do not fit '
+                             f'in int16 codes')
+
+    def _bucket_label(self, bucket_idx, temp_lower):
+        """ Temperature bucket label (bin edge) from the bucket code
+        """
+
+        if self.moving_window_size is not None:
+            return kernels.window_bucket_label(bucket_idx,
+                                               temp_lower,
+                                               self.temp_interval_size)
+
+        return kernels.bucket_label(bucket_idx,
+                                    temp_lower,
+                                    self.temp_interval_size)
+
+    def bucket_labels(self, temp_bucket):
+        """ Temperature bucket labels (bin edges) from the int16 codes
+
+        Parameters:
+            - temp_bucket (xr.DataArray): bucket codes with a `time`
+              dimension, like `bucket_index_xr`.
+
+        Returns: xr.DataArray of float labels, NaN for cells without bucket.
+        """
+
+        return xr.apply_ufunc(self._bucket_label,
+                              temp_bucket,
+                              self.temperature_bounds.temp_lower,
+                              dask='parallelized',
+                              output_dtypes=[np.float64])
+
+    @cachedproperty
+    def bucket_index_xr(self):
+        """ Integer temperature bucket per grid cell
+
+        Bucket indices are calculated arithmetically from the daily lower
+        edge, reproducing the `pd.cut` bins without building a DataFrame. With
+        `self.moving_window_size`, the edges of the window ending in each date
+        are used instead, reproducing the `np.digitize` bins. With
+        `self.temp_bounds`, all dates use the same edges, and values outside
+        the bounds are placed in the first or last bucket.
+
+        Returns: xr.DataArray (time, lat, lon) with int16 bucket codes.
+        """
+
+        bounds = self.temperature_bounds
+        self._check_bucket_codes(self.n_buckets)
+
+        if self.moving_window_size is not None:
+            bucket_idx = xr.apply_ufunc(kernels.window_bucket_index,
+                                        self.data_array[self.temp_var],
+                                        bounds.temp_lower,
+                                        bounds.temp_upper,
+                                        kwargs={
+                                            'interval': self.temp_interval_size
+                                        },
+                                        dask='parallelized',
+                                        output_dtypes=[np.int16])
         else:
-            buckets_arr = None
+            if self.temp_bounds is not None:
+                n_buckets = self.n_buckets
+            else:
+                n_buckets = None
 
-        return buckets_arr
+            bucket_idx = xr.apply_ufunc(kernels.bucket_index,
+                                        self.data_array[self.temp_var],
+                                        bounds.temp_lower,
+                                        kwargs={
+                                            'interval': self.temp_interval_size,
+                                            'n_buckets': n_buckets
+                                        },
+                                        dask='parallelized',
+                                        output_dtypes=[np.int16])
+
+        return bucket_idx.reset_coords(drop=True)
 
     @cachedproperty
-    def grid_area_xr(self):
-        """ Cumulative area calculation per temperature bin and date
+    def bucket_area_xr(self):
+        """ Area per temperature bucket and date
 
-        This functions takes a dask.DataFrame and calculates the cumulative
-        area per temperature bin, defined by the cut_interval option, and
-        grouped by date. The function uses Dask objects and returns a computed
-        pd.DataFrame.
-
-        Returns: xr.DataArray with cumulative area maps per time.
-        """
-
-        dd_data_group = (
-            self.data_array_dask_df
-            .reset_index(drop=True)
-            .groupby(['temp_bucket', 'time'])
-            .area_grid
-            .sum()
-        ).compute()
-
-        # Cumumlative sum
-        dd_data_group_time = (
-            dd_data_group
-            .sort_index()
-            .groupby(level=[1])
-            .cumsum()
-            .reset_index()
-        )
+        Area-weighted histograms are accumulated per block of timesteps, so
+        the result has only (time, bucket) elements instead of one row per
+        gridpoint. Buckets are indexed by integer from `temp_lower`.
 
-        # Calculate effective latitudes by using the temperature area weights
-        dd_data_group_time['cdf_eff_lat_deg'] = (
-            dd_data_group_time
-            .groupby('time')
-            .area_grid
-            .apply(self._distributions_lat_eff)
+        Returns: xr.DataArray (time, bucket) with the area per bucket.
+        """
+
+        n_buckets = self.n_buckets
+
+        bucket_area = xr.apply_ufunc(kernels.bucket_histogram,
+                                     self.bucket_index_xr,
+                                     self.cell_area_xr,
+                                     input_core_dims=[['lat', 'lon'], ['lat']],
+                                     output_core_dims=[['bucket']],
+                                     kwargs={'n_buckets': n_buckets},
+                                     dask='parallelized',
+                                     output_dtypes=[np.float64],
+                                     dask_gufunc_kwargs={
+                                         'output_sizes': {'bucket': n_buckets}
+                                     })
+
+        return bucket_area.assign_coords(
+            temp_lower=self.temperature_bounds.temp_lower
         )
 
-        dd_group_time_array = (
-            dd_data_group_time
-            .set_index(['time', 'temp_bucket'])
-            .to_xarray()
+    @cachedproperty
+    def effective_latitude_table(self):
+        """ Cumulative effective latitude per date and bucket
+
+        A small dense table, chunked along time as the data, that is looked
+        up by integer bucket index to get the effective latitude of each
+        grid cell.
+
+        Returns: xr.DataArray (time, bucket).
+        """
+
+        return self._distributions_lat_eff(
+            xr.apply_ufunc(kernels.cumulative_bucket_area,
+                           self.bucket_area_xr,
+                           dask='parallelized',
+                           output_dtypes=[np.float64])
         )
-        dd_group_time_array_delayed = dd_group_time_array.chunk(self.chunks)
 
-        return  dd_group_time_array_delayed
+    def _effective_latitude_array(self):
+        """ DataArray with effective latitude (array engine)
+
+        The cumulative effective latitude per bucket and date is a small
+        table that is looked up by bucket index in each block of the data.
+        """
+
+        eff_lat_xr = xr.apply_ufunc(kernels.bucket_lookup,
+                                    self.effective_latitude_table.astype(
+                                        self.dtype
+                                    ),
+                                    self.bucket_index_xr,
+                                    input_core_dims=[['bucket'],
+                                                     ['lat', 'lon']],
+                                    output_core_dims=[['lat', 'lon']],
+                                    dask='parallelized',
+                                    output_dtypes=[self.dtype])
+
+        eff_lat_xr = eff_lat_xr.reset_coords(drop=True).transpose(*self.DIMS)
+
+        return eff_lat_xr.sortby(['lat', 'lon'])
 
     @cachedproperty
+    @profiled('grid_area_xr')
+    def grid_area_xr(self):
+        """ Cumulative area calculation per temperature bin and date
+
+        This functions takes the area per temperature bin and date from
+        `bucket_area_xr`, calculates the cumulative area per temperature bin,
+        defined by the `temp_interval_size` option, and places it in the
+        temperature bucket labels of each date, to have the same output than a
+        group-by over the gridpoint data. Dates without buckets are dropped.
+
+        The bucket labels are known from `temperature_bounds`, so the areas
+        stay lazy and are computed per time chunk. Labels are all the
+        buckets between the bounds of each date, and a label without area in
+        any date is kept as NaN.
+
+        Returns: xr.Dataset with cumulative area maps per time.
+        """
+
+        bounds = self.temperature_bounds
+        bucket_idx = np.arange(self.n_buckets)
+        in_bounds = bucket_idx < self.date_buckets[:, None]
+
+        labels = self._bucket_label(bucket_idx,
+                                    bounds.temp_lower.values[:, None])
+        temp_buckets = np.unique(labels[in_bounds])
+        label_idx = np.where(in_bounds,
+                             np.searchsorted(temp_buckets, labels),
+                             -1)
+
+        label_idx = xr.DataArray(label_idx,
+                                 dims=['time', 'bucket'],
+                                 coords={'time': bounds.time})
+        label_idx = label_idx.chunk({
+            'time': self.bucket_area_xr.chunks[0],
+            'bucket': -1
+        })
+
+        area_grid = xr.apply_ufunc(kernels.scatter_buckets,
+                                   xr.apply_ufunc(
+                                       kernels.cumulative_bucket_area,
+                                       self.bucket_area_xr,
+                                       dask='parallelized',
+                                       output_dtypes=[np.float64]),
+                                   label_idx,
+                                   input_core_dims=[['bucket'], ['bucket']],
+                                   output_core_dims=[['temp_bucket']],
+                                   kwargs={'n_labels': temp_buckets.size},
+                                   dask='parallelized',
+                                   output_dtypes=[np.float64],
+                                   dask_gufunc_kwargs={
+                                       'output_sizes': {
+                                           'temp_bucket': temp_buckets.size
+                                       }
+                                   })
+
+        grid_area = xr.Dataset(
+            {
+                'area_grid': area_grid,
+                'cdf_eff_lat_deg': self._distributions_lat_eff(area_grid)
+            }
+        ).reset_coords(drop=True)
+        grid_area = grid_area.assign_coords(temp_bucket=temp_buckets)
+
+        dates = self.date_buckets > 0
+
+        return grid_area.isel(time=dates)
+
+    @cachedproperty
+    @profiled('effective_latitude_xr')
     def effective_latitude_xr(self):
         """ DataArray with effective latitude
+
+        The effective latitude of each grid cell is looked up by date and
+        integer bucket in `effective_latitude_table`, chunk by chunk in time,
+        in blocks of the data array (`array` engine) or in the partitions of
+        `data_array_dask_df` (`dataframe` engine).
         """
 
-        grid_areas_ddf = self.grid_area_xr.to_dataframe().reset_index()
-        grid_areas_ddf = grid_areas_ddf[
-            ['temp_bucket', 'cdf_eff_lat_deg', 'time']
-        ]
+        if self.engine == 'array':
+            eff_lat_xr = self._effective_latitude_array()
+            eff_lat_xr.name = 'effective_latitude'
+            return eff_lat_xr
+
+        # Each partition holds a time chunk, so it is paired with the same
+        # time chunk of the effective latitude table, without a merge.
+        array_ddf = self.data_array_dask_df
+        table = self.effective_latitude_table.data.rechunk({1: -1})
+        table = table.astype(self.dtype)
+        table_blocks = table.to_delayed().ravel()
+
+        if array_ddf.npartitions != len(table_blocks):
+            raise ValueError(f'{array_ddf.npartitions} partitions do not '
+                             f'match the {len(table_blocks)} time chunks of '
+                             f'the data')
+
+        time_starts = np.cumsum((0, ) + table.chunks[0][:-1])
+        n_cells = self.data_array.lat.size * self.data_array.lon.size
 
-        merge_ddf = (
-            self.data_array_dask_df
-            .reset_index(drop=True)
-            #.repartition(npartitions=100)
-            .merge(grid_areas_ddf,
-                   on=['time', 'temp_bucket'],
-                   how='left')
+        meta = array_ddf._meta.assign(
+            cdf_eff_lat_deg=pd.Series([], dtype=self.dtype)
+        )
+        lookup_ddf = dd.from_delayed(
+            [
+                dask.delayed(self._lookup_partition)(partition,
+                                                     table_block,
+                                                     time_start,
+                                                     n_cells)
+                for partition, table_block, time_start in zip(
+                    array_ddf.to_delayed(),
+                    table_blocks,
+                    time_starts
+                )
+            ],
+            meta=meta
         )
 
-        eff_lat_xr = self.dask_data_to_xarray(merge_ddf,
+        eff_lat_xr = self.dask_data_to_xarray(lookup_ddf,
                                               var='cdf_eff_lat_deg')
 
         eff_lat_xr.name = 'effective_latitude'
 
         return eff_lat_xr
 
+    @staticmethod
+    def _lookup_partition(df, table, time_start, n_cells):
+        """ Look up the effective latitude of each row in a partition
+
+        Parameters:
+            - df (pd.DataFrame): partition of `data_array_dask_df`.
+            - table (np.array): (time, bucket) effective latitude table for
+              the time chunk of the partition.
+            - time_start (int): position of the first date of the chunk.
+            - n_cells (int): number of grid cells per date.
+        """
+
+        time_idx = df.grid_index.values // n_cells - time_start
+        bucket_idx = df.temp_bucket.values
+        cdf_eff_lat = table[time_idx, np.clip(bucket_idx, 0, None)]
+
+        return df.assign(cdf_eff_lat_deg=np.where(bucket_idx >= 0,
+                                                  cdf_eff_lat,
+                                                  np.nan))
+
     def vectorized_temp_ref(self, cdf_eff_lat, latitudes, temp_bin_edges):
         """
         Latitudinal reference temperature to capture the gradient effect of the
@@ -435,23 +1257,29 @@ class Template(ABC):
         return t_ref
 
     @cachedproperty
+    @profiled('t_prime_calculation')
     def t_prime_calculation(self):
         """ Jet-stream metric
-        return: A delayed dask.DataFrame with the t-prime, t-ref. 
-        """
 
-        t_ref = np.apply_along_axis(self.vectorized_temp_ref,
-                                    axis=1,
-                                    arr=self.grid_area_xr.cdf_eff_lat_deg,
-                                    temp_bin_edges=self.grid_area_xr.temp_bucket,
-                                    latitudes=self.data_array.lat.values)
+        The reference temperature is interpolated for all timesteps in a block
+        at once (see `kernels.interp_temp_ref`), chunk by chunk along time,
+        so `t_ref` stays lazy.
 
-        t_ref_arr = xr.DataArray(t_ref,
-                                 coords=[
-                                     ('time', self.grid_area_xr.time.values), 
-                                     ('lat', self.data_array.lat.values)
-                                 ])
+        return: A delayed xr.Dataset with the t-prime, t-ref.
+        """
 
+        grid_area = self.grid_area_xr
+        t_ref_arr = xr.apply_ufunc(kernels.interp_temp_ref,
+                                   grid_area.cdf_eff_lat_deg,
+                                   grid_area.temp_bucket,
+                                   self.data_array.lat,
+                                   input_core_dims=[['temp_bucket'],
+                                                    ['temp_bucket'],
+                                                    ['lat']],
+                                   output_core_dims=[['lat']],
+                                   kwargs={'dtype': self.dtype},
+                                   dask='parallelized',
+                                   output_dtypes=[self.dtype])
 
         t_combined = t_ref_arr.\
             combine_first(self.data_array[self.temp_var]).\
@@ -462,38 +1290,68 @@ class Template(ABC):
 
         return t_combined
 
+    @profiled('dask_data_to_xarray')
     def dask_data_to_xarray(self, df, var=None):
         """
         Transform delayed dask.DataFrame to xarray object
 
-        Import Dask dataframes to xarrays is not easy job with large data frames.
-        This function takes a delayed dask data frame and calculates the right
-        shape to create a Dask DataFrame. 
+        Rows of `data_array_dask_df` carry their flat position in the grid
+        (`grid_index`), and each partition holds complete dates of a time
+        chunk of `self.data_array`. Each partition is placed in its block of
+        an array chunked as the data, in one pass and without computing the
+        dimension values or the chunk sizes first.
 
         Parameters:
-            - df (dask.DataFrame): a delayed Dask dataframe.
+            - df (dask.DataFrame): a delayed Dask dataframe built from
+              `data_array_dask_df`, with the `grid_index` column.
+            - var (str): column to transform.
 
-        Return: xarray Dataset
+        Return: xarray DataArray
         """
 
-        lazy_values = [dask.delayed(df[dim].unique()) for dim in self.DIMS]
-        dims_values = [future for future in dask.compute(*lazy_values)]
-        shape = tuple([len(x) for x in dims_values])
-
-        var_array = df[var].values
-        var_array.compute_chunk_sizes()
-        var_array_reshape = var_array.reshape(shape)
-        tuple_data = (self.DIMS, var_array_reshape)
-
-        coords_dict = dict(zip(self.DIMS, dims_values))
-        #values_dicts = dict(zip(extract_vars, values_arrays))
+        temp = self.data_array[self.temp_var].transpose(*self.DIMS)
+        time_chunks = temp.chunks[0]
+        block_size = temp.shape[1] * temp.shape[2]
+
+        if df.npartitions != len(time_chunks):
+            raise ValueError(f'{df.npartitions} partitions do not match the '
+                             f'{len(time_chunks)} time chunks of the data')
+
+        starts = np.cumsum((0, ) + time_chunks[:-1]) * block_size
+        partitions = df[['grid_index', var]].to_delayed()
+
+        blocks = [
+            da.from_delayed(
+                dask.delayed(self._scatter_partition)(partition,
+                                                      var,
+                                                      start,
+                                                      (n_times, ) +
+                                                      temp.shape[1:],
+                                                      self.dtype),
+                shape=(n_times, ) + temp.shape[1:],
+                dtype=self.dtype)
+            for partition, start, n_times in zip(partitions,
+                                                 starts,
+                                                 time_chunks)
+        ]
 
-        xarr = xr.DataArray(var_array_reshape, 
-                            coords=dims_values,
+        xarr = xr.DataArray(da.concatenate(blocks, axis=0),
+                            coords={dim: temp[dim] for dim in self.DIMS},
                             dims=self.DIMS)
 
         return xarr.sortby(['lat', 'lon'])
 
+    @staticmethod
+    def _scatter_partition(df, var, start, shape, dtype):
+        """ Place a DataFrame partition in its block of the grid
+        """
+
+        return kernels.scatter_values(df.grid_index.values,
+                                      df[var].values,
+                                      start,
+                                      shape,
+                                      dtype)
+
     def build_save_dirs(self):
         if self.path_to_save is not None:
             product_dir = os.path.join(self.path_to_save, self.product)
@@ -0,0 +1,140 @@
+"""
+Mean, standard deviation, skewness and kurtosis in a single pass.
+
+Each chunk is reduced to its count and central moments (mean and the sums of
+the second, third and fourth powers of the deviations), and the chunks are
+merged pairwise with the parallel formulas of Chan et al. and Pébay in a tree
+reduction. The data are read once, and central moments avoid the
+cancellation errors of raw power sums.
+"""
+
+import numpy as np
+import xarray as xr
+import dask.array as da
+
+STATS = ['mean', 'std', 'skew', 'kurtosis']
+
+
+def _chunk_moments(values):
+    """ Count, mean and central moment sums of a block along the first axis
+
+    Returns: np.array with shape (1, 5, *values.shape[1:]) with the count,
+    mean, M2, M3 and M4.
+    """
+
+    valid = ~np.isnan(values)
+    n = valid.sum(axis=0)
+    total = np.where(valid, values, 0).sum(axis=0)
+    mean = np.divide(total, n, out=np.zeros(n.shape), where=n > 0)
+    deviation = np.where(valid, values - mean, 0)
+
+    return np.stack([
+        n,
+        mean,
+        (deviation**2).sum(axis=0),
+        (deviation**3).sum(axis=0),
+        (deviation**4).sum(axis=0),
+    ])[np.newaxis]
+
+
+def _merge_moments(partials):
+    """ Merge the moments of a block of partials into one
+
+    Returns: np.array with shape (1, 5, ...)
+    """
+
+    n_a, mean_a, m2_a, m3_a, m4_a = partials[0]
+
+    for n_b, mean_b, m2_b, m3_b, m4_b in partials[1:]:
+        n = n_a + n_b
+        # Cells without values in both partials keep zeros
+        n_safe = np.where(n > 0, n, 1)
+        delta = mean_b - mean_a
+        delta_n = delta / n_safe
+
+        m4_a = (m4_a + m4_b +
+                delta * delta_n**3 * n_a * n_b *
+                (n_a**2 - n_a * n_b + n_b**2) +
+                6 * delta_n**2 * (n_a**2 * m2_b + n_b**2 * m2_a) +
+                4 * delta_n * (n_a * m3_b - n_b * m3_a))
+        m3_a = (m3_a + m3_b +
+                delta * delta_n**2 * n_a * n_b * (n_a - n_b) +
+                3 * delta_n * (n_a * m2_b - n_b * m2_a))
+        m2_a = m2_a + m2_b + delta * delta_n * n_a * n_b
+        mean_a = mean_a + delta_n * n_b
+        n_a = n
+
+    return np.stack([n_a, mean_a, m2_a, m3_a, m4_a])[np.newaxis]
+
+
+def central_moments(values, split_every=8):
+    """ Count, mean and central moment sums along the first axis
+
+    Dask arrays are reduced chunk by chunk, and the partial moments are
+    merged in a tree of `split_every` partials per node.
+
+    Returns: np.array or da.Array with shape (5, *values.shape[1:]) with the
+    count, mean, M2, M3 and M4 of the non-NaN values.
+    """
+
+    if not isinstance(values, da.Array):
+        return _chunk_moments(values)[0]
+
+    space = ''.join(chr(ord('a') + i) for i in range(values.ndim - 1))
+    partials = da.blockwise(_chunk_moments, 'tm' + space,
+                            values, 't' + space,
+                            new_axes={'m': 5},
+                            adjust_chunks={'t': 1},
+                            dtype=np.float64)
+
+    while partials.numblocks[0] > 1:
+        partials = partials.rechunk({0: split_every})
+        partials = partials.map_blocks(
+            _merge_moments,
+            chunks=((1, ) * partials.numblocks[0], ) + partials.chunks[1:],
+            dtype=np.float64
+        )
+
+    return partials[0]
+
+
+def moment_stats(data, dim='time', stats=['mean', 'std', 'skew']):
+    """ Statistics of `data` along `dim` from one pass over the data
+
+    NaNs are ignored. The standard deviation has no degrees of freedom
+    correction and the skewness and kurtosis are biased, which matches
+    `xr.DataArray.std` and the defaults of `scipy.stats.skew` and
+    `scipy.stats.kurtosis` (Fisher's definition).
+
+    Parameters:
+        - data (xr.DataArray): data to reduce.
+        - dim (str): dimension to reduce.
+        - stats (list): statistics to calculate, from `STATS`.
+
+    Returns: xr.DataArray with a `stat` dimension. Lazy if `data` is
+    dask-backed.
+    """
+
+    for stat in stats:
+        if stat not in STATS:
+            raise ValueError(f'{stat} is not a valid statistic: {STATS}')
+
+    data = data.transpose(dim, ...)
+    n, mean, m2, m3, m4 = central_moments(data.data)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = m2 / n
+        values = {
+            'mean': mean,
+            'std': variance**0.5,
+            'skew': (m3 / n) / variance**1.5,
+            'kurtosis': (m4 / n) / variance**2 - 3,
+        }
+
+    like = data.isel({dim: 0}, drop=True)
+    count = like.copy(data=n)
+    statistics = [
+        like.copy(data=values[stat]).where(count > 0) for stat in stats
+    ]
+
+    return xr.concat(statistics, dim='stat').assign_coords({'stat': stats})
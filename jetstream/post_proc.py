@@ -8,12 +8,12 @@ import matplotlib.pyplot as plt
 import xarray as xr
 import pandas as pd
 from scipy import fft, fftpack
-from scipy.stats import skew
 from matplotlib.colors import LogNorm
 import joypy
 import cartopy.crs as ccrs
 from descriptors import cachedproperty
 from distributed.client import _get_global_client
+from jetstream import climatology, manifest, moments
 
 class SingleModelPostProcessor(object):
     """ Post-processing routines for analysis of climate models and reanalysis
@@ -24,29 +24,63 @@ class SingleModelPostProcessor(object):
                  path_to_input_files,
                  chunks={'time': 1},
                  diagnostic_var='t_prime',
-                 season='DJF'):
+                 season='DJF',
+                 path_to_baselines=None):
         self.chunks = chunks
         self.path_to_files = path_to_input_files
         self.season = season
         self.var = diagnostic_var
+        self.path_to_baselines = path_to_baselines
+
+    @property
+    def product(self):
+        """ Product name from the input files, without glob patterns
+
+        For a list of files, the name comes from the first file.
+        """
+        path = self.path_to_files
+        if isinstance(path, (list, tuple)):
+            path = path[0]
+        path = os.path.normpath(str(path))
+        return os.path.basename(path).split('.')[0].rstrip('*_')
+
+    @property
+    def baseline_key(self):
+        """ Name of the baselines of the input files in `path_to_baselines`
+
+        The product name and a fingerprint of the input files (see
+        `jetstream.manifest.input_fingerprint`), so different file sets
+        never share baselines.
+        """
+        fingerprint = manifest.input_fingerprint(self.path_to_files)
+        return f'{self.product}_{fingerprint[:12]}'
 
     @staticmethod
     def sel_winters(data,start_year=2015,end_year=2100):
-        winters = pd.date_range('%i-12-01'%start_year,'%i-02-28'%(start_year+1),freq='D')
-        for i in range(start_year+1,end_year):
-            begin = i
-            end = i+1
-            winters=winters.union(pd.date_range('%i-12-01'%begin,'%i-02-28'%end,freq='D'))
-        try:
-            selected = data.sel(time=winters)
-        except KeyError: # if my last year doesn't have JF
-            winters = winters.drop(pd.date_range('%i-01-01'%end_year,
-                                                 '%i-02-28'%end_year,
-                                                 freq='D'
-                                                )
-                                  )
-            selected = data.sel(time=winters)
-        return selected
+        """ Select the DJF winters starting from `start_year` to `end_year`
+
+        Each December, January and February date gets the year of its
+        December (winter year), and the dates with a winter year in
+        [`start_year`, `end_year`) are selected by index. Leap days are kept,
+        missing dates are ignored, and dask-backed data stays lazy.
+
+        Parameters
+        ---------
+            - data xr.Dataset or xr.DataArray: data with a `time` coordinate,
+              either `datetime64` or `cftime`.
+            - start_year int: year of the first December.
+            - end_year int: year after the last December.
+
+        Returns
+        ------
+            xr.Dataset or xr.DataArray
+        """
+        month = data.time.dt.month.values
+        winter_year = group_into_winters(data.time)
+        in_winters = (np.isin(month, [12, 1, 2]) &
+                      (winter_year >= start_year) &
+                      (winter_year < end_year))
+        return data.isel(time=np.flatnonzero(in_winters))
 
     @cachedproperty
     def dataset(self):
@@ -55,10 +89,18 @@ class SingleModelPostProcessor(object):
         if client is None:
             print(f'WARNING! No Dask client available in environment!')
 
-        _full_dataset = xr.open_mfdataset(self.path_to_files,
-                                         chunks=self.chunks,
-                                         concat_dim='time',
-                                         preprocess=self.preprocess_mf)
+        if str(self.path_to_files).endswith('.zarr'):
+            # All windows of a product are in a single consolidated store
+            _full_dataset = self.preprocess_mf(
+                xr.open_zarr(self.path_to_files,
+                             chunks=self.chunks,
+                             consolidated=True)
+            )
+        else:
+            _full_dataset = xr.open_mfdataset(self.path_to_files,
+                                             chunks=self.chunks,
+                                             concat_dim='time',
+                                             preprocess=self.preprocess_mf)
         self.year_range = np.unique(_full_dataset.time.dt.year)[[0,-1]]
         if self.season == 'DJF':
             try:
@@ -83,41 +125,73 @@ class SingleModelPostProcessor(object):
         return array_new
 
     @staticmethod
-    def demean(data, decade=False):
+    def baseline(data, path_to_baselines=None, key=None):
+        """ Day-of-year and decade baselines of `data`
+
+        Baselines are computed in one pass over the data (see
+        `jetstream.climatology`), and stay lazy for dask-backed data. If
+        `path_to_baselines` and `key` are set, they are computed and saved
+        there, keyed by input files, variable and period (first and last
+        winter), and loaded instead of computed next time.
+
+        Parameters
+        ---------
+            - path_to_baselines str: directory of the saved baselines.
+            - key str: name of the input files (see `baseline_key`).
+
+        Returns
+        ------
+            xr.Dataset
+        """
+        winters = group_into_winters(data.time)
+        if key is not None:
+            key = f'{key}_{data.name}_{winters[0]}_{winters[-1]}'
+        return climatology.climatology(data,
+                                       (winters//10)*10,
+                                       cache_dir=path_to_baselines,
+                                       key=key)
+
+    @staticmethod
+    def demean(data, decade=False, path_to_baselines=None, key=None):
         """ Calculate demeaned anomaly with daily and decadal baselines
 
         This function calculates the demeaded temperature by either calculating
         a day-of-the-year baseline mean, by default, or by calculating a decade mean.
         This operation is grid-based, so it is calculating daily and decade
-        means. 
+        means. Decades are counted by winter year (see `group_into_winters`),
+        so a winter is never split between two decades.
+
+        Both baselines come from one pass over the data (see `baseline`), and
+        the anomaly subtracts the baseline of each date chunk by chunk.
 
         Parameters
         ---------
             - decade bool: Demean by decades. Default is `False`.
+            - path_to_baselines str: directory to save and load the
+              baselines. Default is `None` (not saved).
+            - key str: name of the input files in `path_to_baselines` (see
+              `baseline_key`). Baselines are only saved with a key.
 
         Returns
         ------
             xr.Dataset
         """
 
-        if decade:
-            #data = data.assign_coords(year=('time',
-            #    group_into_winters(data.time)))
-            decade_day_idx = pd.MultiIndex.from_arrays(
-                    [((data.time.dt.year//10)*10).data,
-                        data.time.dt.dayofyear.data])
-            data.coords['decade_day'] = ('time', decade_day_idx)
-            grp_by = 'decade_day'
-        else:
-            grp_by = 'time.dayofyear'
+        if isinstance(data, xr.Dataset):
+            return data.map(
+                lambda x: SingleModelPostProcessor.demean(
+                    x, decade, path_to_baselines, key
+                ) if 'time' in x.dims else x
+            )
 
-        xr_mean = (data.
-                   groupby(grp_by).
-                   mean()
-                   )
+        decades = None
+        if decade:
+            decades = (group_into_winters(data.time)//10)*10
 
-        demeaned = data.groupby(grp_by) - xr_mean
-        return demeaned.drop('decade_day',errors='ignore')
+        baseline = SingleModelPostProcessor.baseline(data,
+                                                     path_to_baselines,
+                                                     key)
+        return climatology.anomaly(data, baseline, decades)
 
     def demeaned_shift(self, data, decade=False):
         """ Shifted demeaned effective latitude
@@ -131,40 +205,58 @@ class SingleModelPostProcessor(object):
             xr.Dataset
         """
 
-        demeaned_array = self.demean(data, decade=decade)
+        demeaned_array = self.demean(data,
+                                     decade=decade,
+                                     path_to_baselines=self.path_to_baselines,
+                                     key=self.baseline_key)
         demeaned_shift = demeaned_array + data.lat
 
         return demeaned_shift
 
-    def stats_calc(self,data):
+    def stats_calc(self, data, kurtosis=False):
+        """ Mean, standard deviation and skewness of `self.var` over time
+
+        All the statistics come from one pass over the data (see
+        `jetstream.moments`), and the result is lazy for dask-backed data.
+        Skewness and kurtosis match the biased `scipy.stats` estimators with
+        `nan_policy='omit'`.
+
+        Parameters
+        ---------
+            - kurtosis bool: Add the kurtosis. Default is `False`.
+
+        Returns
+        ------
+            xr.DataArray with a `stat` dimension.
+        """
         try:
             data = data.drop('expver')
         except ValueError:
             pass
-        mean = data.mean(dim='time')[self.var]
-        std = data.std(dim='time')[self.var]
-        skewness = xr.DataArray(
-                data=skew(data[self.var], nan_policy='omit'),
-                dims=mean.dims,
-                coords=mean.coords
-                )
-        #statistics = xr.Dataset(dict(stats=(
-        #    ['stat','lat','lon'],[
-        #    mean,
-        #    std,
-        #    xr.ones_like(mean)*skewness
-        #    ])
-        #    ),
-        #    coords={'stat':['mean','std','skewness'],
-        #        'lat':mean.lat,'lon':mean.lon}
-        #    )
-        statistics=xr.concat(
-            [mean,std,skewness],#skewness*xr.ones_like(mean)],
-            dim='stat'
-            ).assign_coords({'stat':['mean','std','skew']})
-        return statistics
-
-    def diagnostic_stats(self,demean=False):
+        stats = ['mean', 'std', 'skew']
+        if kurtosis:
+            stats.append('kurtosis')
+        return moments.moment_stats(data[self.var], dim='time', stats=stats)
+
+    def diagnostic_stats(self, demean=False, kurtosis=False):
+        """ Statistics of the first and last decades and their difference
+
+        The statistics of both periods and their difference are built in a
+        single graph and computed once, so the input is read once for all
+        the periods and statistics. The small result is kept in memory for
+        the plots. With `demean`, only `self.var` is demeaned, and the
+        baselines of each period are computed in the same graph, unless they
+        are saved in `path_to_baselines` (see `baseline`).
+
+        Parameters
+        ---------
+            - demean bool: Statistics of the demeaned data. Default is `False`.
+            - kurtosis bool: Add the kurtosis. Default is `False`.
+
+        Returns
+        ------
+            xr.DataArray with `period` and `stat` dimensions.
+        """
         data=self.dataset
         present = (self.year_range[0],self.year_range[0]+10)
         future = (self.year_range[-1]-10,self.year_range[-1])
@@ -173,64 +265,63 @@ class SingleModelPostProcessor(object):
 
         if demean:
            try:
-               data_present_dm = self.data_present_dm
-               data_future_dm = self.data_future_dm
+               data_present = self.data_present_dm
+               data_future = self.data_future_dm
            except AttributeError:
-               data_present_dm = self.demean(self.data_present)
-               data_future_dm = self.demean(self.data_future)
-           self.stats_present = self.stats_calc(data_present_dm)
-           self.stats_future = self.stats_calc(data_future_dm)
-           self.stats_diff =  self.stats_future - self.stats_present
-
+               data_present = self.demean(
+                   self.data_present[[self.var]],
+                   path_to_baselines=self.path_to_baselines,
+                   key=self.baseline_key
+               )
+               data_future = self.demean(
+                   self.data_future[[self.var]],
+                   path_to_baselines=self.path_to_baselines,
+                   key=self.baseline_key
+               )
         else:
-           self.stats_present = self.stats_calc(self.data_present)
-           self.stats_future = self.stats_calc(self.data_future)
-           self.stats_diff = self.stats_future - self.stats_present
-
-    def diagnostic_plot(self, demean=False, path_to_save="./"):
-         self.diagnostic_stats(demean=demean)
-         xr_all = xr.concat([
-             self.stats_present,
-             self.stats_future,
-             self.stats_diff],
-             dim='period').assign_coords({
-                 'period':['first_decade','last_decade','difference']
-                 })
-         xr_all.to_netcdf(path_to_save+'_statistics.nc4')
-         print('plotting...')
-         p = xr_all.sel(stat='mean').plot.imshow(
-                 transform=ccrs.PlateCarree(),
-                 col='period',
-                 subplot_kws={
-                     'projection':ccrs.Orthographic(20, 90)
-                     }
-                 )
-         for ax in p.axes.flat:
-             ax.coastlines()
-             ax.gridlines()
-         plt.savefig(path_to_save+'_mean.png')
-         p = xr_all.sel(stat='std').plot.imshow(
-                 transform = ccrs.PlateCarree(),
-                 col='period',
-                 subplot_kws={
-                     'projection': ccrs.Orthographic(20, 90)
-                     }
-                 )
-         for ax in p.axes.flat:
-             ax.coastlines()
-             ax.gridlines()
-         plt.savefig(path_to_save+'_std.png')
-         p = xr_all.sel(stat='skew').plot.imshow(
-                 transform=ccrs.PlateCarree(),
-                 col='period',
-                 subplot_kws={
-                     'projection':ccrs.Orthographic(20, 90)
-                     }
-                 )
-         for ax in p.axes.flat:
-             ax.coastlines()
-             ax.gridlines()
-         plt.savefig(path_to_save+'_skew.png')
+           data_present = self.data_present
+           data_future = self.data_future
+
+        stats_present = self.stats_calc(data_present, kurtosis=kurtosis)
+        stats_future = self.stats_calc(data_future, kurtosis=kurtosis)
+        statistics = xr.concat([
+            stats_present,
+            stats_future,
+            stats_future - stats_present],
+            dim='period').assign_coords({
+                'period':['first_decade','last_decade','difference']
+                })
+
+        self.statistics = statistics.compute()
+        self.stats_present = self.statistics.sel(period='first_decade', drop=True)
+        self.stats_future = self.statistics.sel(period='last_decade', drop=True)
+        self.stats_diff = self.statistics.sel(period='difference', drop=True)
+
+        return self.statistics
+
+    def diagnostic_plot(self, demean=False, path_to_save="./", kurtosis=False):
+        """ Save the statistics and a map of each statistic per period
+
+        Statistics are computed once (see `diagnostic_stats`) and written to
+        `<path_to_save>_statistics.nc4`, and the plots
+        (`<path_to_save>_<stat>.png`) are drawn from the computed result.
+        """
+        xr_all = self.diagnostic_stats(demean=demean, kurtosis=kurtosis)
+        xr_all.to_netcdf(path_to_save+'_statistics.nc4')
+        print('plotting...')
+        for stat in xr_all.stat.values:
+            p = xr_all.sel(stat=stat).plot.imshow(
+                    transform=ccrs.PlateCarree(),
+                    col='period',
+                    subplot_kws={
+                        'projection':ccrs.Orthographic(20, 90)
+                        }
+                    )
+            for ax in p.axes.flat:
+                ax.coastlines()
+                ax.gridlines()
+            plt.savefig(path_to_save+f'_{stat}.png')
+            plt.close()
 
 
 #---- helper functions ----#
@@ -245,7 +336,9 @@ def run_demeaning(path_processed,
          season='DJF')
     #demean or shift
     filename=path_postproc+f'{shortname}_{var_of_interest}_demeaned.nc4'
-    single.demean(single.dataset[var_of_interest],decade=decade
+    single.demean(single.dataset[var_of_interest],decade=decade,
+            path_to_baselines=single.path_to_baselines,
+            key=single.baseline_key
             ).rename(f'dm_{var_of_interest}').to_netcdf(filename)
     #elif var_of_interest == 'eff_lat':
     #    filename=path_postproc+f'{shortname}_{var_of_interest}_demeaned_shifted.nc4'
@@ -255,12 +348,23 @@ def run_demeaning(path_processed,
     return single
 
 def group_into_winters(dates):
-    year_arr = np.zeros(len(dates),dtype=int)
-    y=0
-    for date in dates:
-        if date.dt.month <= 3:
-            year_arr[y] = date.dt.year - 1
-        else:
-            year_arr[y] = date.dt.year
-        y+=1
-    return year_arr
+    """ Winter year of each date
+
+    Dates from January to March belong to the winter that started the
+    previous year, so they get the previous year. The other dates keep their
+    year. Years and months are read for all the dates at once.
+
+    Parameters
+    ---------
+        - dates xr.DataArray, pd.DatetimeIndex or xr.CFTimeIndex: dates,
+          with `datetime64` or `cftime` values.
+
+    Returns
+    ------
+        np.array of ints
+    """
+    if isinstance(dates, xr.DataArray):
+        dates = dates.dt
+    month = np.asarray(dates.month)
+    year = np.asarray(dates.year)
+    return year - (month <= 3)
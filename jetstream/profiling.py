@@ -0,0 +1,250 @@
+"""
+Per-stage profiling of the pipeline methods.
+
+Stages are timed with their number of dask tasks, bytes read and written, and
+peak memory. With a `dask.distributed` client, tasks, I/O and memory are
+collected from the workers and a dask performance report can be saved per
+stage; otherwise they are collected from this process and its children.
+
+Pipeline stages build lazy dask graphs, so profiled stages are persisted
+inside their context: the time, tasks and memory of a stage are those of
+computing it, and the stages after it start from its results in memory.
+"""
+
+import json
+import time
+import functools
+import threading
+import dask
+import psutil
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from dask.callbacks import Callback
+from distributed import get_task_stream, performance_report, wait
+from distributed.client import _get_global_client
+
+
+def _process_tree():
+    process = psutil.Process()
+    return [process] + process.children(recursive=True)
+
+
+def _local_rss():
+    rss = 0
+    for process in _process_tree():
+        try:
+            rss += process.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass
+
+    return rss
+
+
+def _local_io():
+    read_bytes, write_bytes = 0, 0
+    for process in _process_tree():
+        try:
+            counters = process.io_counters()
+        except (psutil.NoSuchProcess, AttributeError):
+            continue
+        read_bytes += counters.read_bytes
+        write_bytes += counters.write_bytes
+
+    return read_bytes, write_bytes
+
+
+def io_counters(client=None):
+    """ Bytes read and written by the dask workers of `client`, or by this
+    process and its children if there is no client
+
+    Returns: tuple of ints (read_bytes, write_bytes), or (None, None) if the
+    platform has no I/O counters.
+    """
+
+    try:
+        if client is None:
+            return _local_io()
+
+        worker_io = client.run(_local_io)
+        return (sum(r for r, _ in worker_io.values()),
+                sum(w for _, w in worker_io.values()))
+    except AttributeError:
+        return None, None
+
+
+class TaskCounter(Callback):
+    """ Count tasks run by the local dask schedulers
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.n_tasks = 0
+
+    def _pretask(self, key, dsk, state):
+        self.n_tasks += 1
+
+
+class MemorySampler(object):
+    """ Peak memory sampled in a background thread
+
+    With a client, the peak is the largest worker memory reported to the
+    scheduler. Without a client, it is the resident memory of this process
+    and its children (e.g. the workers of a `LocalCluster`).
+    """
+
+    def __init__(self, client=None, interval=0.1):
+        self.client = client
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def memory(self):
+        if self.client is None:
+            return _local_rss()
+
+        workers = self.client.scheduler_info()['workers'].values()
+        return max([w['metrics']['memory'] for w in workers], default=0)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.memory())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.memory()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.memory())
+
+
+class StageProfiler(object):
+    """ Collect metrics of the pipeline stages
+
+    Stages can be nested (e.g. `grid_area_xr` needs `temperature_bounds`),
+    and the metrics of a stage include its nested stages.
+    """
+
+    def __init__(self):
+        self.stages = []
+        self._depth = 0
+
+    @contextmanager
+    def stage(self, name, performance_report_path=None):
+        """ Profile the code run inside the context as stage `name`
+
+        Parameters:
+            - name (str): stage name.
+            - performance_report_path (str): path of the dask performance
+              report (HTML). Only saved if a client exists and the stage is
+              not nested, as the report of a stage covers its nested stages.
+        """
+
+        client = _get_global_client()
+
+        if client is not None:
+            task_stream = get_task_stream(client)
+            if performance_report_path is not None and self._depth == 0:
+                report = performance_report(filename=performance_report_path)
+            else:
+                report = nullcontext()
+                performance_report_path = None
+        else:
+            task_stream = TaskCounter()
+            report = nullcontext()
+            performance_report_path = None
+
+        record = {
+            'stage': name,
+            'depth': self._depth,
+            'started': datetime.now().isoformat(),
+        }
+        self.stages.append(record)
+        read_start, write_start = io_counters(client)
+
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            with report, task_stream as tasks, MemorySampler(client) as memory:
+                yield
+        finally:
+            self._depth -= 1
+            record['wall_time'] = time.perf_counter() - start
+
+        read_end, write_end = io_counters(client)
+
+        if client is not None:
+            record['n_tasks'] = len(tasks.data)
+        else:
+            record['n_tasks'] = tasks.n_tasks
+
+        if read_start is not None:
+            record['bytes_read'] = read_end - read_start
+            record['bytes_written'] = write_end - write_start
+        else:
+            record['bytes_read'] = record['bytes_written'] = None
+
+        record['peak_memory'] = memory.peak
+        record['performance_report'] = performance_report_path
+
+    @staticmethod
+    def persist(result):
+        """ Compute a lazy stage result and keep it in memory
+
+        With a client, the result is kept in the workers and the call waits
+        for it, so the compute time is part of the stage.
+
+        Returns: the persisted result, or `result` if it is not lazy.
+        """
+
+        if not dask.is_dask_collection(result):
+            return result
+
+        result, = dask.persist(result)
+        if _get_global_client() is not None:
+            wait(result)
+
+        return result
+
+    def report(self):
+        """ Profiled stages in the order they started
+
+        Returns: dict with the stages and the time the report was created.
+        """
+
+        return {
+            'created': datetime.now().isoformat(),
+            'stages': self.stages
+        }
+
+    def save(self, path):
+        """ Write the report as JSON
+        """
+
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+def profiled(name):
+    """ Decorate a `Template` method to profile it as stage `name`
+
+    The method runs inside `Template.profile_stage`, which is a no-op unless
+    profiling is enabled. If profiling is enabled, a lazy result is persisted
+    inside the stage (see `StageProfiler.persist`).
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.profile_stage(name):
+                result = method(self, *args, **kwargs)
+                if self.profiler is not None:
+                    result = self.profiler.persist(result)
+                return result
+        return wrapper
+
+    return decorator
@@ -0,0 +1,59 @@
+"""
+Synthetic surface temperature fields for tests and benchmarks.
+"""
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+
+def synthetic_temperature(resolution=2.5,
+                          start_date='2000-11-01',
+                          end_date='2003-03-31',
+                          n_days=None,
+                          product='analysis',
+                          dtype=np.float64,
+                          seed=0):
+    """ Synthetic daily surface temperature field on a regular grid
+
+    Temperatures follow a meridional gradient with a seasonal cycle and
+    random noise, which gives realistic temperature buckets per day. The
+    variable and coordinate names follow the raw files of each product:
+    ERA-like `t2m` on (latitude, longitude) for analysis and CMIP-like `tas`
+    on (lat, lon) for models.
+
+    Parameters:
+        - resolution (float): grid spacing in degrees.
+        - start_date (str): first date.
+        - end_date (str): last date, if `n_days` is not given.
+        - n_days (int): number of daily timesteps from `start_date`.
+        - product (str): 'analysis' or 'model'.
+        - dtype (np.dtype): temperature type.
+        - seed (int): seed of the random noise.
+
+    Returns: xr.Dataset
+    """
+
+    rng = np.random.default_rng(seed)
+    lat = np.arange(90, -90 - resolution / 2, -resolution)
+    lon = np.arange(0, 360, resolution)
+    if n_days is None:
+        times = pd.date_range(start_date, end_date, freq='D')
+    else:
+        times = pd.date_range(start_date, periods=n_days, freq='D')
+
+    seasonal = 10 * np.cos(2 * np.pi * times.dayofyear / 365.25)
+    gradient = 300 - 60 * np.sin(np.deg2rad(lat)) ** 2
+    temp = (gradient[np.newaxis, :, np.newaxis] +
+            seasonal.values[:, np.newaxis, np.newaxis] +
+            rng.normal(0, 5, size=(times.size, lat.size, lon.size)))
+
+    if product == 'analysis':
+        temp_var, dims = 't2m', ['time', 'latitude', 'longitude']
+    else:
+        temp_var, dims = 'tas', ['time', 'lat', 'lon']
+
+    return xr.Dataset(
+        {temp_var: (dims, temp.astype(dtype))},
+        coords={dims[0]: times, dims[1]: lat, dims[2]: lon}
+    )
@@ -0,0 +1,14 @@
+import pytest
+
+from jetstream.synthetic import synthetic_temperature
+
+
+@pytest.fixture(scope='session')
+def era_file(tmp_path_factory):
+    """ Path of a synthetic ERA-like NetCDF file with three DJF winters
+    """
+
+    path = tmp_path_factory.mktemp('data') / 'era.nc'
+    synthetic_temperature().to_netcdf(path)
+
+    return path
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from jetstream import climatology
+
+
+def winter_decades(time):
+    year = time.dt.year.values - (time.dt.month.values <= 3)
+    return (year // 10) * 10
+
+
+def groupby_anomaly(data, decade=False):
+    """ Anomaly from xarray groupby means, as the original demean
+    """
+
+    group = data.time.dt.dayofyear.values
+    if decade:
+        group = winter_decades(data.time) * 1000 + group
+    data = data.assign_coords(group=('time', group))
+
+    means = data.groupby('group').mean()
+    return (data.groupby('group') - means).drop_vars('group')
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    times = pd.date_range('2001-11-01', '2011-03-31', freq='D')
+    values = rng.normal(size=(times.size, 2, 3))
+    values[rng.random(values.shape) < 0.1] = np.nan
+
+    return xr.DataArray(values,
+                        dims=['time', 'lat', 'lon'],
+                        coords={'time': times,
+                                'lat': [0., 1.],
+                                'lon': [0., 1., 2.]},
+                        name='t_prime')
+
+
+@pytest.mark.parametrize('decade', [False, True])
+@pytest.mark.parametrize('chunks', [None, {'time': 1}])
+def test_anomaly_matches_groupby(data, decade, chunks):
+    decades = winter_decades(data.time)
+    if chunks is not None:
+        data = data.chunk(chunks)
+
+    baseline = climatology.baselines(data, decades)
+    anomaly = climatology.anomaly(data, baseline,
+                                  decades if decade else None)
+
+    if chunks is not None:
+        assert anomaly.chunks == data.chunks
+    xr.testing.assert_allclose(anomaly.compute(),
+                               groupby_anomaly(data.load(), decade))
+
+
+@pytest.mark.parametrize('decade', [False, True])
+def test_dates_without_baseline_are_nan(data, decade):
+    decades = winter_decades(data.time)
+    doy = data.time.dt.dayofyear.values
+    # Baselines of the DJF winters before 2010
+    in_baseline = (data.time.dt.month.isin([12, 1, 2]).values &
+                   (decades < 2010))
+    baseline = climatology.baselines(data.chunk({'time': 1})[in_baseline],
+                                     decades[in_baseline])
+
+    anomaly = climatology.anomaly(data.chunk({'time': 1}), baseline,
+                                  decades if decade else None).compute()
+
+    # Dates are matched by day of year (and decade)
+    missing = ~np.isin(doy, doy[in_baseline])
+    if decade:
+        missing |= decades >= 2010
+    assert missing.sum() > 0
+    assert anomaly[missing].isnull().all()
+    assert (anomaly[~missing].notnull().sum() ==
+            data[~missing].notnull().sum())
@@ -0,0 +1,31 @@
+import pytest
+import xarray as xr
+
+from jetstream.model.analysis import Analysis
+
+
+def outputs(path, engine, moving_window_size):
+    analysis = Analysis(
+        path_to_files=path,
+        subset_dict={'time': slice('2000-12-01', '2001-03-01'), 'lat': 20},
+        season='DJF',
+        temp_interval_size=1,
+        moving_window_size=moving_window_size,
+        chunks={'time': 10},
+        rescale_longitude=True,
+        engine=engine
+    )
+
+    return (analysis.grid_area_xr.compute(),
+            analysis.effective_latitude_xr.sortby('time').compute(),
+            analysis.t_prime_calculation.compute())
+
+
+@pytest.mark.parametrize('moving_window_size', [None, 5])
+def test_engines_match(era_file, moving_window_size):
+    dataframe = outputs(era_file, 'dataframe', moving_window_size)
+    array = outputs(era_file, 'array', moving_window_size)
+
+    # Grid area and effective latitude CDF, effective latitude, t_prime
+    for expected, result in zip(dataframe, array):
+        xr.testing.assert_equal(result.transpose(*expected.dims), expected)
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from jetstream.model import kernels
+from jetstream.model.template import Template
+
+LATITUDES = np.arange(90, 19, -2.5)
+
+
+def curves(n_rows=50, n_buckets=40, seed=0):
+    """ Decreasing cumulative effective latitude curves with NaN padding
+    """
+
+    rng = np.random.default_rng(seed)
+    steps = rng.uniform(0.1, 5, size=(n_rows, n_buckets))
+    cdf = 95 - np.cumsum(steps, axis=1)
+
+    for row in range(n_rows):
+        n_valid = rng.integers(2, n_buckets)
+        start = rng.integers(0, n_buckets - n_valid + 1)
+        cdf[row, :start] = np.nan
+        cdf[row, start + n_valid:] = np.nan
+
+    labels = 200 + np.arange(n_buckets, dtype=np.float64)
+
+    return cdf, labels
+
+
+def per_row_temp_ref(cdf, labels):
+    return np.stack([
+        Template.vectorized_temp_ref(None, row, LATITUDES, labels)
+        for row in cdf
+    ])
+
+
+def test_interp_temp_ref_matches_per_row_nan_padded():
+    cdf, labels = curves()
+
+    t_ref = kernels.interp_temp_ref(cdf, labels, LATITUDES)
+
+    np.testing.assert_array_equal(t_ref, per_row_temp_ref(cdf, labels))
+
+
+def test_interp_temp_ref_single_point_rows():
+    cdf, labels = curves(n_rows=5)
+    cdf[:] = np.nan
+    cdf[np.arange(5), [0, 3, 10, 20, 39]] = [88, 60, 45.5, 30, 21]
+
+    t_ref = kernels.interp_temp_ref(cdf, labels, LATITUDES)
+
+    np.testing.assert_array_equal(t_ref, per_row_temp_ref(cdf, labels))
+
+
+def test_interp_temp_ref_all_nan_rows():
+    cdf, labels = curves(n_rows=4)
+    cdf[[1, 3]] = np.nan
+
+    t_ref = kernels.interp_temp_ref(cdf, labels, LATITUDES)
+
+    assert np.isnan(t_ref[[1, 3]]).all()
+    # np.interp can not interpolate an empty curve
+    with pytest.raises(ValueError):
+        Template.vectorized_temp_ref(None, cdf[1], LATITUDES, labels)
+    np.testing.assert_array_equal(t_ref[[0, 2]],
+                                  per_row_temp_ref(cdf[[0, 2]], labels))
+
+
+def test_interp_temp_ref_keeps_leading_dims_and_dtype():
+    cdf, labels = curves(n_rows=12)
+
+    t_ref = kernels.interp_temp_ref(cdf.reshape(3, 4, -1), labels, LATITUDES,
+                                    dtype=np.float32)
+
+    assert t_ref.shape == (3, 4, LATITUDES.size)
+    assert t_ref.dtype == np.float32
+    np.testing.assert_array_equal(
+        t_ref.reshape(12, -1),
+        per_row_temp_ref(cdf, labels).astype(np.float32)
+    )
@@ -0,0 +1,60 @@
+import shutil
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from jetstream.manifest import RunManifest
+
+WINDOWS = [('2000-12-01', '2001-03-01'), ('2001-12-01', '2002-03-01')]
+
+
+def window_dataset(start_date, end_date):
+    times = pd.date_range(start_date, end_date, freq='D')
+    return xr.Dataset({'t_prime': (['time', 'lat'],
+                                   np.zeros((times.size, 3)))},
+                      coords={'time': times, 'lat': [20., 30., 40.]})
+
+
+def write_window(store, start_date, end_date):
+    dataset = window_dataset(start_date, end_date)
+    try:
+        dataset.to_zarr(store, mode='w-', consolidated=True)
+    except (FileExistsError, ValueError):
+        dataset.to_zarr(store, append_dim='time', consolidated=True)
+
+
+def test_store_windows_complete_while_dates_are_stored(tmp_path):
+    store = str(tmp_path / 'product_t_prime.zarr')
+    manifest = RunManifest(str(tmp_path / 'manifest.json'))
+    outputs = {'t_prime': store}
+
+    for start_date, end_date in WINDOWS:
+        write_window(store, start_date, end_date)
+        manifest.record(f'{start_date}_{end_date}', 'fingerprint', outputs,
+                        (start_date, end_date))
+
+    manifest = RunManifest(manifest.path)
+    for start_date, end_date in WINDOWS:
+        assert manifest.is_complete(f'{start_date}_{end_date}',
+                                    'fingerprint', outputs)
+
+    # The store is recreated with the second window only
+    shutil.rmtree(store)
+    write_window(store, *WINDOWS[1])
+
+    assert not manifest.is_complete('_'.join(WINDOWS[0]), 'fingerprint',
+                                    outputs)
+    assert manifest.is_complete('_'.join(WINDOWS[1]), 'fingerprint',
+                                outputs)
+
+
+def test_store_windows_without_dates_are_not_complete(tmp_path):
+    store = str(tmp_path / 'product_t_prime.zarr')
+    manifest = RunManifest(str(tmp_path / 'manifest.json'))
+    write_window(store, *WINDOWS[0])
+
+    manifest.record('_'.join(WINDOWS[0]), 'fingerprint', {'t_prime': store})
+
+    assert not manifest.is_complete('_'.join(WINDOWS[0]), 'fingerprint',
+                                    {'t_prime': store})
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+import xarray as xr
+from scipy import stats
+
+from jetstream import moments
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    values = rng.gamma(2, 3, size=(97, 4, 5)) + 250
+    values[rng.random(values.shape) < 0.2] = np.nan
+    # A cell without values and a cell with a single value
+    values[:, 0, 0] = np.nan
+    values[1:, 0, 1] = np.nan
+
+    return xr.DataArray(values, dims=['time', 'lat', 'lon'])
+
+
+@pytest.mark.parametrize('chunks', [
+    None,
+    {'time': -1},
+    {'time': (1, 10, 3, 40, 2, 41)},
+    {'time': 1},
+])
+def test_moment_stats_match_scipy(data, chunks):
+    values = data.values
+    if chunks is not None:
+        data = data.chunk(chunks)
+
+    result = moments.moment_stats(data, stats=moments.STATS)
+    if chunks is not None:
+        assert result.chunks is not None
+    result = result.compute()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = {
+            'mean': np.nanmean(values, axis=0),
+            'std': np.nanstd(values, axis=0),
+            'skew': stats.skew(values, axis=0, nan_policy='omit'),
+            'kurtosis': stats.kurtosis(values, axis=0, nan_policy='omit'),
+        }
+
+    for stat in moments.STATS:
+        computed = result.sel(stat=stat).values
+        # Cells without values
+        assert np.isnan(computed[0, 0])
+        computed[0, 0] = expected[stat][0, 0] = 0
+        np.testing.assert_allclose(computed,
+                                   np.ma.filled(expected[stat], np.nan),
+                                   rtol=1e-8, atol=1e-10)
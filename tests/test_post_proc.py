@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+post_proc = pytest.importorskip('jetstream.post_proc')
+SingleModelPostProcessor = post_proc.SingleModelPostProcessor
+
+
+@pytest.fixture
+def daily():
+    times = pd.date_range('2015-01-01', '2020-12-31', freq='D')
+    return xr.DataArray(np.arange(times.size, dtype=float),
+                        dims='time',
+                        coords={'time': times}).chunk({'time': 100})
+
+
+def test_sel_winters_keeps_leap_days(daily):
+    winters = SingleModelPostProcessor.sel_winters(daily, 2015, 2020)
+    times = winters.indexes['time']
+
+    assert pd.Timestamp('2016-02-29') in times
+    assert pd.Timestamp('2020-02-29') in times
+    assert set(times.month) == {12, 1, 2}
+    # Winters from Dec 2015 to Feb 2020, every day
+    expected = pd.date_range('2015-12-01', '2020-02-29', freq='D')
+    assert times.equals(expected[expected.month.isin([12, 1, 2])])
+
+
+def test_sel_winters_years_in_range(daily):
+    winters = SingleModelPostProcessor.sel_winters(daily, 2016, 2018)
+    winter_years = post_proc.group_into_winters(winters.time)
+
+    assert winter_years.min() == 2016
+    assert winter_years.max() == 2017
+    assert winters.time[0].dt.strftime('%Y-%m-%d') == '2016-12-01'
+    assert winters.time[-1].dt.strftime('%Y-%m-%d') == '2018-02-28'
+    # Lazy selection
+    assert winters.chunks is not None
+
+
+def test_group_into_winters_cftime():
+    times = xr.cftime_range('2015-11-01', '2016-04-30', calendar='noleap')
+
+    winter_years = post_proc.group_into_winters(times)
+
+    assert winter_years[0] == 2015
+    assert (winter_years[times.month <= 3] == 2015).all()
+    assert (winter_years[times.month == 4] == 2016).all()
+
+
+def test_demean_is_static(daily):
+    demeaned = SingleModelPostProcessor.demean(daily, decade=True)
+
+    assert demeaned.chunks is not None
+    np.testing.assert_allclose(
+        demeaned.groupby('time.dayofyear').mean().sel(dayofyear=[1, 200]),
+        0, atol=1e-9
+    )
+
+
+def test_baseline_key_of_file_lists(tmp_path):
+    paths = [tmp_path / f'era5_t_prime_{year}.nc' for year in range(3)]
+    for path in paths:
+        path.touch()
+
+    first = SingleModelPostProcessor(paths[:2])
+    second = SingleModelPostProcessor(paths[1:])
+
+    assert first.product == 'era5_t_prime_0'
+    assert SingleModelPostProcessor(f'{tmp_path}/era5_t_prime_*.nc'
+                                    ).product == 'era5_t_prime'
+    assert first.baseline_key != second.baseline_key
+    assert first.baseline_key == SingleModelPostProcessor(paths[:2]
+                                                          ).baseline_key
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from jetstream.model.analysis import Analysis
+
+
+def pipeline(path, precision, engine):
+    analysis = Analysis(
+        path_to_files=path,
+        subset_dict={'time': slice('2000-12-01', '2001-03-01'), 'lat': 20},
+        season='DJF',
+        temp_interval_size=1,
+        chunks={'time': 10},
+        rescale_longitude=True,
+        engine=engine,
+        precision=precision
+    )
+
+    return (analysis.t_prime_calculation.compute(),
+            analysis.effective_latitude_xr.compute())
+
+
+@pytest.mark.parametrize('engine', ['dataframe', 'array'])
+def test_float32_matches_float64(era_file, engine):
+    t_prime_64, eff_lat_64 = pipeline(era_file, 'float64', engine)
+    t_prime_32, eff_lat_32 = pipeline(era_file, 'float32', engine)
+
+    assert t_prime_32.t_prime.dtype == np.float32
+    assert eff_lat_32.dtype == np.float32
+
+    # Temperatures within float32 rounding of the buckets
+    np.testing.assert_allclose(t_prime_32.t_prime, t_prime_64.t_prime,
+                               atol=2e-2)
+
+    # A few cells near a bucket edge flip bucket
+    eff_lat_diff = np.abs(eff_lat_32.values - eff_lat_64.values)
+    assert np.isnan(eff_lat_32.values).sum() == np.isnan(eff_lat_64.values).sum()
+    assert np.nanmean(eff_lat_diff > 1e-3) < 0.005
+    assert np.nanmax(eff_lat_diff) < 2
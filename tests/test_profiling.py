@@ -0,0 +1,28 @@
+import json
+
+from jetstream.model.analysis import Analysis
+
+
+def test_stages_carry_their_compute(era_file, tmp_path):
+    analysis = Analysis(
+        path_to_files=era_file,
+        path_to_save_files=str(tmp_path),
+        subset_dict={'time': slice('2000-12-01', '2001-03-01'), 'lat': 20},
+        season='DJF',
+        temp_interval_size=1,
+        chunks={'time': 10},
+        rescale_longitude=True,
+        profile=True
+    )
+    analysis.pipeline_methods
+
+    with open(analysis.profile_file) as f:
+        stages = {stage['stage']: stage for stage in json.load(f)['stages']}
+
+    for name in ['temperature_bounds', 'grid_area_xr',
+                 'effective_latitude_xr', 't_prime_calculation']:
+        assert stages[name]['n_tasks'] > 0
+    # The stages are computed before their writes
+    assert stages['t_prime_calculation']['depth'] == 0
+    assert stages['effective_latitude_xr']['depth'] == 0
+    assert stages['write_eff_lat']['n_tasks'] < stages['grid_area_xr']['n_tasks']
@@ -0,0 +1,37 @@
+from jetstream.model.analysis import Analysis
+
+
+def test_changing_options_invalidates_cached_results(era_file):
+    analysis = Analysis(
+        path_to_files=era_file,
+        subset_dict={'time': slice('2000-12-01', '2001-03-01'), 'lat': 20},
+        season='DJF',
+        temp_interval_size=1,
+        chunks={'time': 10},
+        rescale_longitude=True
+    )
+    assert analysis.t_prime_calculation.sizes['time'] == 90
+
+    analysis.season = 'MAM'
+
+    assert analysis.t_prime_calculation.sizes['time'] == 1
+    assert analysis.data_array.sizes['time'] == 1
+    assert analysis.n_dataset_opens == 2
+    assert len(analysis._dataset_cache) == 1
+
+
+def test_modifying_subset_invalidates_cached_results(era_file):
+    analysis = Analysis(
+        path_to_files=era_file,
+        subset_dict={'time': slice('2000-12-01', '2001-03-01'), 'lat': 20},
+        temp_interval_size=1,
+        chunks={'time': 10}
+    )
+    assert analysis.data_array.sizes['time'] == 91
+    analysis.temperature_bounds
+
+    analysis.subset_dict['time'] = slice('2000-12-01', '2000-12-31')
+
+    assert analysis.data_array.sizes['time'] == 31
+    assert analysis.temperature_bounds.sizes['time'] == 31
+    assert len(analysis._dataset_cache) == 1
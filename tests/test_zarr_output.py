@@ -0,0 +1,90 @@
+import dask
+import numpy as np
+import pytest
+import xarray as xr
+
+from jetstream.model.analysis import Analysis
+from jetstream.model.template import Template
+
+WINDOWS = [
+    ('2000-12-01', '2001-03-01'),
+    ('2001-12-01', '2002-03-01'),
+    ('2002-12-01', '2003-03-01'),
+]
+
+
+def run_window(path, save_path, start_date, end_date, output_format):
+    save_path.mkdir(exist_ok=True)
+    analysis = Analysis(
+        path_to_files=path,
+        path_to_save_files=str(save_path),
+        subset_dict={'time': slice(start_date, end_date), 'lat': 20},
+        season='DJF',
+        temp_interval_size=1,
+        chunks={'time': 7},
+        rescale_longitude=True,
+        output_format=output_format
+    )
+    analysis.pipeline_methods
+
+    return analysis.output_files
+
+
+@pytest.mark.parametrize('n_times, offset, store_chunk, expected', [
+    (20, 0, 7, (7, 7, 6)),
+    (20, 181, 7, (1, 7, 7, 5)),
+    (2, 181, 7, (1, 1)),
+    (14, 7, 7, (7, 7)),
+])
+def test_aligned_time_chunks(n_times, offset, store_chunk, expected):
+    chunks = Template.aligned_time_chunks(n_times, offset, store_chunk)
+
+    assert chunks == expected
+    assert sum(chunks) == n_times
+    # Chunks after the first one start on a store chunk boundary
+    assert all((offset + sum(chunks[:i])) % store_chunk == 0
+               for i in range(1, len(chunks)))
+
+
+def test_zarr_windows_match_netcdf(era_file, tmp_path):
+    netcdf_files = [
+        run_window(era_file, tmp_path / 'netcdf', start, end, 'netcdf')
+        for start, end in WINDOWS
+    ]
+    for start, end in WINDOWS:
+        zarr_files = run_window(era_file, tmp_path / 'zarr', start, end,
+                                'zarr')
+    # Process a window again to overwrite its dates with a region write
+    run_window(era_file, tmp_path / 'zarr', *WINDOWS[1], 'zarr')
+
+    for output, var in [('t_prime', 't_prime'),
+                        ('eff_lat', 'effective_latitude')]:
+        expected = xr.concat(
+            [xr.open_dataset(files[output])[var] for files in netcdf_files],
+            dim='time'
+        )
+        stored = xr.open_zarr(zarr_files[output])[var].load()
+
+        assert stored.sizes['time'] == expected.sizes['time']
+        np.testing.assert_array_equal(
+            stored.transpose(*expected.dims).values, expected.values
+        )
+
+
+def test_concurrent_windows_keep_all_dates(era_file, tmp_path):
+    # Windows of 5 dates in 7 dates store chunks share their edge chunks
+    analysis = Analysis(path_to_files=era_file, chunks={'time': 7})
+    data = xr.open_dataset(era_file).isel(time=slice(0, 60)).rename(
+        {'latitude': 'lat', 'longitude': 'lon'}
+    ).load()
+    store = str(tmp_path / 't2m.zarr')
+
+    writes = [
+        analysis.write_zarr(data.isel(time=slice(start, start + 5)), store,
+                            compute=False)
+        for start in range(0, 60, 5)
+    ]
+    dask.compute(*writes, scheduler='processes', num_workers=4)
+
+    stored = xr.open_zarr(store).load()
+    xr.testing.assert_equal(stored, data)